@@ -0,0 +1,115 @@
+"""
+Kubernetes job status polling against a local fake API server
+
+compares a fresh API client per call (one new connection each time)
+with one shared client and with a single labelled job listing
+
+    python benchmarks/kube_client_bench.py [--jobs N] [--latency SECONDS]
+"""
+
+import argparse
+import http.server
+import json
+import threading
+import time
+
+from kubernetes import client
+
+
+def job(name):
+    return {
+        "apiVersion": "batch/v1",
+        "kind": "Job",
+        "metadata": {"name": name, "namespace": "default"},
+        "status": {"succeeded": 1},
+    }
+
+
+class FakeApiServer(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body go out in separate writes, avoid delayed-ACK stalls
+    disable_nagle_algorithm = True
+    latency = 0
+    prefix = "/apis/batch/v1/namespaces/default/jobs"
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == self.prefix:
+            body = {
+                "kind": "JobList",
+                "metadata": {},
+                "items": [job("job{}".format(i)) for i in range(self.server.njobs)],
+            }
+        else:
+            body = job(path.rsplit("/", 1)[-1])
+        # simulated connection setup cost, paid once per new connection
+        if not getattr(self, "connected", False):
+            time.sleep(self.latency)
+            self.connected = True
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.002)
+    args = parser.parse_args()
+
+    FakeApiServer.latency = args.latency
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), FakeApiServer)
+    server.daemon_threads = True
+    server.njobs = args.jobs
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    configuration = client.Configuration()
+    configuration.host = "http://127.0.0.1:{}".format(server.server_address[1])
+    names = ["job{}".format(i) for i in range(args.jobs)]
+
+    def per_call():
+        for name in names:
+            with client.ApiClient(configuration) as api_client:
+                api = client.BatchV1Api(api_client)
+                assert api.read_namespaced_job(name, "default").status.succeeded
+
+    shared_client = client.ApiClient(configuration)
+    shared_api = client.BatchV1Api(shared_client)
+
+    def shared():
+        for name in names:
+            assert shared_api.read_namespaced_job(name, "default").status.succeeded
+
+    def listing():
+        joblist = shared_api.list_namespaced_job("default", limit=500)
+        assert len(joblist.items) == args.jobs
+
+    # warm up imports and the shared pool before timing
+    shared_api.read_namespaced_job("warmup", "default")
+
+    print(
+        "{} job status reads, {:.1f}ms connection setup".format(
+            args.jobs, args.latency * 1000
+        )
+    )
+    print("new client per call: {:8.3f}s".format(timed(per_call)))
+    print("shared client:       {:8.3f}s".format(timed(shared)))
+    print("one job listing:     {:8.3f}s".format(timed(listing)))
+    shared_client.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+leaf enumeration of 1k-100k leaf documents: the pure-Python walker used by
+utils.leaf_iterator and TypedLeafs.leafs() against the jq based enumeration
+they replaced. The old TypedLeafs.leafs() also re-parsed the document for
+every leaf, it is only timed up to --quadratic-max leafs.
+
+    python benchmarks/leafs_bench.py [--sizes 1000,10000,100000]
+"""
+
+import argparse
+import time
+
+import jq
+import jsonpointer
+
+import packtivity.utils as utils
+from packtivity.typedleafs import TypedLeafs
+
+
+def document(nleafs):
+    return {
+        "par{}".format(i): {"value": i, "name": "leaf{}".format(i), "tags": [i, "x"]}
+        for i in range(nleafs // 4)
+    }
+
+
+def jq_leaf_iterator(jsonable):
+    # utils.leaf_iterator before the pure-Python walker
+    allleafs = jq.jq("paths(scalars)").transform(jsonable, multiple_output=True)
+    leafpointers = [jsonpointer.JsonPointer.from_parts(x) for x in allleafs]
+    for x in leafpointers:
+        yield x, x.get(jsonable)
+
+
+def jq_typedleafs_leafs(data):
+    # TypedLeafs.leafs() before, each leaf was read from a freshly parsed view
+    ptrs = [
+        jsonpointer.JsonPointer.from_parts(parts)
+        for parts in data.jq("paths(scalars)", multiple_output=True).typed()
+    ]
+    for p in ptrs:
+        data._invalidate()
+        yield p, p.get(data.typed())
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--quadratic-max", type=int, default=10000)
+    args = parser.parse_args()
+
+    print(
+        "{:>8} {:>12} {:>12} {:>16} {:>16}".format(
+            "leafs", "jq iterator", "walker", "old .leafs()", "new .leafs()"
+        )
+    )
+    for nleafs in [int(s) for s in args.sizes.split(",")]:
+        doc = document(nleafs)
+        data = TypedLeafs(doc)
+        old = list(jq_leaf_iterator(doc))
+        assert old == list(utils.leaf_iterator(doc))
+        assert len(old) == nleafs
+
+        jq_iter = timed(lambda: list(jq_leaf_iterator(doc)))
+        walker = timed(lambda: list(utils.leaf_iterator(doc)))
+        if nleafs <= args.quadratic_max:
+            old_leafs = "{:>15.3f}s".format(
+                timed(lambda: list(jq_typedleafs_leafs(data)))
+            )
+        else:
+            old_leafs = "{:>16}".format("skipped")
+        data._invalidate()
+        new_leafs = timed(lambda: list(data.leafs()))
+        print(
+            "{:>8} {:>11.3f}s {:>11.3f}s {} {:>15.3f}s".format(
+                nleafs, jq_iter, walker, old_leafs, new_leafs
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
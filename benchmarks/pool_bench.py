@@ -0,0 +1,70 @@
+"""
+submission latency and throughput of many short jobs on MultiProcBackend.
+A private pool per backend is what every backend (and every restored proxy)
+used to spawn, a shared pool is reused across backends.
+
+    python benchmarks/pool_bench.py [--jobs N] [--poolsize P] [--start-method M]
+"""
+
+import argparse
+import time
+
+from packtivity.asyncbackends import MultiProcBackend
+
+
+def short_job(i):
+    return i * i
+
+
+class Job(object):
+    # picklable nullary callable, as submit() would build
+    def __init__(self, i):
+        self.i = i
+
+    def __call__(self):
+        return short_job(self.i)
+
+
+def backend_per_job(njobs, shared, start_method):
+    start = time.perf_counter()
+    for i in range(njobs):
+        with MultiProcBackend(1, start_method=start_method, shared=shared) as backend:
+            assert backend.result(backend.submit_callable(Job(i))) == i * i
+    return (time.perf_counter() - start) / njobs
+
+
+def throughput(njobs, poolsize, start_method):
+    with MultiProcBackend(poolsize, start_method=start_method) as backend:
+        backend.result(backend.submit_callable(Job(0)))
+        start = time.perf_counter()
+        proxies = [backend.submit_callable(Job(i)) for i in range(njobs)]
+        submitted = time.perf_counter() - start
+        assert [backend.result(p) for p in proxies] == [i * i for i in range(njobs)]
+        return submitted / njobs, njobs / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=200)
+    parser.add_argument("--poolsize", type=int, default=4)
+    parser.add_argument("--start-method", default=None)
+    args = parser.parse_args()
+
+    private = backend_per_job(args.jobs, False, args.start_method)
+    # a long-lived user keeps the shared pool alive, as a running workflow does
+    with MultiProcBackend(1, start_method=args.start_method):
+        shared = backend_per_job(args.jobs, True, args.start_method)
+    submit, rate = throughput(args.jobs * 10, args.poolsize, args.start_method)
+
+    print("{} jobs, start method {}".format(args.jobs, args.start_method or "default"))
+    print("backend per job, private pool: {:8.2f}ms/job".format(private * 1e3))
+    print("backend per job, shared pool:  {:8.2f}ms/job".format(shared * 1e3))
+    print(
+        "pool of {}, {} jobs: {:.1f}us/submit, {:.0f} jobs/s".format(
+            args.poolsize, args.jobs * 10, submit * 1e6, rate
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+cold vs. warm state hashing of a LocalFSState after one file changed
+
+    python benchmarks/statehash_bench.py [--files N] [--size BYTES] [--jobs J]
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from packtivity.statecontexts.posixfs_context import LocalFSState
+from packtivity.statecontexts.statehash import INDEX_NAME
+
+
+def timed(func, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        duration = time.perf_counter() - start
+        best = duration if best is None else min(best, duration)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--size", type=int, default=64 * 1024)
+    parser.add_argument("--jobs", type=int, default=1)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    try:
+        for i in range(args.files):
+            subdir = os.path.join(workdir, "dir{}".format(i % 20))
+            os.makedirs(subdir, exist_ok=True)
+            with open(os.path.join(subdir, "file{}.dat".format(i)), "wb") as f:
+                f.write(os.urandom(args.size))
+        state = LocalFSState([workdir])
+        state.ensure()
+        changed = os.path.join(workdir, "dir0", "file0.dat")
+
+        def change():
+            with open(changed, "ab") as f:
+                f.write(b"x")
+
+        plain = timed(lambda: state.state_hash(jobs=args.jobs))
+        indexpath = os.path.join(state.metadir, INDEX_NAME)
+
+        def cold_hash():
+            if os.path.exists(indexpath):
+                os.remove(indexpath)
+            state.state_hash(incremental=True, jobs=args.jobs)
+
+        def warm_hash():
+            change()
+            state.state_hash(incremental=True, jobs=args.jobs)
+
+        cold = timed(cold_hash)
+        warm = timed(warm_hash)
+        assert state.state_hash(incremental=True) == state.state_hash()
+
+        print("{} files of {} bytes, {} jobs".format(args.files, args.size, args.jobs))
+        print("full dirhash:                 {:8.3f}s".format(plain))
+        print("incremental, cold index:      {:8.3f}s".format(cold))
+        print("incremental, 1 file changed:  {:8.3f}s".format(warm))
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
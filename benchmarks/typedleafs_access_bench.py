@@ -0,0 +1,57 @@
+"""
+per-access cost of TypedLeafs item access with and without the cached typed
+view. The uncached variant drops the view before every access, which is what
+each access used to cost (a full dump/load round trip of the document).
+
+    python benchmarks/typedleafs_access_bench.py [--sizes 100,1000,10000]
+"""
+
+import argparse
+import time
+
+from packtivity.typedleafs import TypedLeafs
+
+
+def document(nleafs):
+    return {
+        "par{}".format(i): {"value": i, "name": "leaf{}".format(i), "tags": [i, "x"]}
+        for i in range(nleafs // 4)
+    }
+
+
+def per_access(func, accesses):
+    start = time.perf_counter()
+    for i in range(accesses):
+        func(i)
+    return (time.perf_counter() - start) / accesses
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="100,1000,10000,100000")
+    parser.add_argument("--accesses", type=int, default=200)
+    args = parser.parse_args()
+
+    print("{:>8} {:>14} {:>14}".format("leafs", "uncached", "cached"))
+    for nleafs in [int(s) for s in args.sizes.split(",")]:
+        data = TypedLeafs(document(nleafs))
+        keys = list(data.json().keys())
+
+        def uncached(i):
+            data._invalidate()
+            data[keys[i % len(keys)]]
+
+        def cached(i):
+            data[keys[i % len(keys)]]
+
+        print(
+            "{:>8} {:>12.1f}us {:>12.3f}us".format(
+                nleafs,
+                per_access(uncached, args.accesses) * 1e6,
+                per_access(cached, args.accesses) * 1e6,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,7 @@
-import time
+import asyncio
 import logging
-from datetime import datetime
 
-from packtivity.utils import load_packtivity
+from packtivity.utils import load_packtivity, backoff_periods, wait_until_ready
 from packtivity.syncbackends import defaultsyncbackend
 
 import packtivity.datamodel as _datamodel
@@ -28,23 +27,67 @@ class pack_object(object):
         waitperiod=0.01,
         timeout=43200,
         datamodel=_datamodel,
+        waitperiods=None,
     ):  # default timeout is 12h
+        """
+        runs the packtivity. When waiting on an async backend its native wait
+        hook is used if available, otherwise ready() is polled with waitperiods
+        (by default an exponential backoff starting at waitperiod).
+        """
 
         parameters = datamodel.create(parameters, state.datamodel)
         syncbackend = defaultsyncbackend()
         if syncbackend and not asyncbackend:
             return syncbackend.run(self.spec, parameters, state)
         elif asyncbackend:
-            submit_time = datetime.fromtimestamp(time.time())
             proxy = asyncbackend.submit(
                 self.spec, parameters, state, metadata={"name": "packtivity"}
             )
             if not asyncwait:
                 return proxy
-            while True:
-                if asyncbackend.ready(proxy):
-                    return asyncbackend.result(proxy)
-                timestamp = datetime.fromtimestamp(time.time())
-                if (timestamp - submit_time).seconds > timeout:
-                    raise RuntimeError("Timeout!")
-                time.sleep(waitperiod)
+            waitperiods = waitperiods or backoff_periods(waitperiod)
+            if not wait_until_ready(asyncbackend, proxy, timeout, waitperiods):
+                raise RuntimeError("Timeout!")
+            return asyncbackend.result(proxy)
+
+    async def acall(
+        self,
+        parameters,
+        state,
+        asyncbackend=None,
+        metadata=None,
+        waitperiod=0.01,
+        timeout=43200,
+        datamodel=_datamodel,
+    ):
+        """
+        asyncio counterpart of __call__, always waits for the result. Without an
+        explicit backend the packtivity runs on an AsyncioBackend. Backends that
+        do not return awaitable proxies are polled with an exponential backoff
+        starting at waitperiod seconds.
+        """
+        from packtivity.asyncbackends import AsyncioBackend
+
+        parameters = datamodel.create(parameters, state.datamodel)
+        owned = asyncbackend is None
+        asyncbackend = asyncbackend or AsyncioBackend()
+        proxy = asyncbackend.submit(
+            self.spec, parameters, state, metadata=metadata or {"name": "packtivity"}
+        )
+
+        async def wait():
+            if hasattr(proxy, "__await__"):
+                return await proxy
+            periods = backoff_periods(waitperiod)
+            while not asyncbackend.ready(proxy):
+                await asyncio.sleep(next(periods))
+            return asyncbackend.result(proxy)
+
+        try:
+            return await asyncio.wait_for(wait(), timeout)
+        except asyncio.TimeoutError:
+            raise RuntimeError("Timeout!")
+        finally:
+            if owned:
+                # do not block the loop on a packtivity that timed out
+                asyncbackend.close(wait=False)
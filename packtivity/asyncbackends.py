@@ -1,9 +1,11 @@
+import asyncio
+import concurrent.futures
 import multiprocessing
+import threading
 import functools
 import sys
 import traceback
 import os
-import json
 import logging
 
 from .syncbackends import (
@@ -19,9 +21,70 @@ from .syncbackends import (
 )
 from packtivity.statecontexts import load_state
 from . import datamodel as _datamodel
+from . import jsoncodec
 
 log = logging.getLogger(__name__)
 
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def acquire_pool(poolsize, start_method=None, shared=True):
+    """
+    returns a multiprocessing pool. Shared pools are reference counted and reused
+    by all callers asking for the same size and start method, they must be given
+    back via release_pool.
+    """
+    if not shared:
+        return multiprocessing.get_context(start_method).Pool(poolsize)
+    key = (poolsize, start_method)
+    with _pools_lock:
+        if key not in _pools:
+            log.debug("creating shared pool of size %s (%s)", poolsize, start_method)
+            _pools[key] = [multiprocessing.get_context(start_method).Pool(poolsize), 0]
+        _pools[key][1] += 1
+        return _pools[key][0]
+
+
+def release_pool(pool):
+    """
+    gives back a pool obtained via acquire_pool. The pool is closed (pending
+    tasks still finish) once no user is left.
+    """
+    with _pools_lock:
+        for key, entry in list(_pools.items()):
+            if entry[0] is pool:
+                entry[1] -= 1
+                if entry[1] > 0:
+                    return
+                del _pools[key]
+                break
+    pool.close()
+    pool.join()
+
+
+class PoolBackendMixin(object):
+    """
+    lifecycle management for backends owning a (possibly shared) process pool.
+    """
+
+    def __init__(self, poolsize=1, start_method=None, shared=True):
+        if poolsize == "auto":
+            poolsize = multiprocessing.cpu_count()
+        log.info("configured pool size to %s", poolsize)
+        self.pool = acquire_pool(int(poolsize), start_method, shared)
+
+    def close(self):
+        if self.pool is not None:
+            release_pool(self.pool)
+            self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
 
 class PacktivityProxyBase(object):
     """
@@ -59,7 +122,7 @@ class ExternalAsyncProxy(PacktivityProxyBase):
     def details(self):
         prox = None
         try:
-            json.dumps(self.jobproxy)
+            jsoncodec.dumps(self.jobproxy)
             prox = self.jobproxy
         except TypeError:
             pass
@@ -101,12 +164,27 @@ class ExternalAsyncMixin(object):
     def ready(self, resultproxy):
         return self.job_backend.ready(resultproxy.jobproxy)
 
+    def ready_many(self, resultproxies):
+        if not hasattr(self.job_backend, "ready_many"):
+            return [self.ready(p) for p in resultproxies]
+        return self.job_backend.ready_many([p.jobproxy for p in resultproxies])
+
     def successful(self, resultproxy):
         return self.job_backend.successful(resultproxy.jobproxy)
 
     def fail_info(self, resultproxy):
         return self.job_backend.fail_info(resultproxy.jobproxy)
 
+    def wait(self, resultproxy, timeout=None):
+        if not hasattr(self.job_backend, "wait"):
+            return self.ready(resultproxy)
+        return self.job_backend.wait(resultproxy.jobproxy, timeout)
+
+    def close(self):
+        close = getattr(self.job_backend, "close", None)
+        if close:
+            close()
+
 
 class RemoteResultMixin(object):
     def __init__(self, **kwargs):
@@ -116,7 +194,9 @@ class RemoteResultMixin(object):
     def result(self, resultproxy):
         state = load_state(resultproxy.statedata, self.deserialization_opts)
         if resultproxy.resultdata is not None:
-            return self.datamodel.create(resultproxy.resultdata, state.datamodel)
+            return self.datamodel.create(
+                resultproxy.resultdata, state.datamodel, normalized=True
+            )
         log.debug(
             "retrieving result for jobid: %s at %s",
             resultproxy.jobproxy["job_id"],
@@ -144,7 +224,9 @@ class ExternalAsyncBackend(ExternalAsyncMixin):
         state = load_state(resultproxy.statedata, self.deserialization_opts)
 
         if resultproxy.resultdata is not None:
-            return self.datamodel.create(resultproxy.resultdata, state.datamodel)
+            return self.datamodel.create(
+                resultproxy.resultdata, state.datamodel, normalized=True
+            )
 
         parameters = self.datamodel.create(resultproxy.pardata, state.datamodel)
         pubdata = publish(resultproxy.spec["publisher"], parameters, state, self.config)
@@ -154,9 +236,9 @@ class ExternalAsyncBackend(ExternalAsyncMixin):
         return pubdata
 
 
-class DefaultExternalJobBackend(object):
-    def __init__(self, config=None):
-        self.pool = multiprocessing.Pool(1)
+class DefaultExternalJobBackend(PoolBackendMixin):
+    def __init__(self, config=None, poolsize=1, start_method=None, shared=True):
+        PoolBackendMixin.__init__(self, poolsize, start_method, shared)
         self.config = packconfig(**config) if config else packconfig()
 
     def submit(self, job):
@@ -173,6 +255,10 @@ class DefaultExternalJobBackend(object):
     def ready(self, resultproxy):
         return resultproxy.ready()
 
+    def wait(self, resultproxy, timeout=None):
+        resultproxy.wait(timeout)
+        return resultproxy.ready()
+
     def successful(self, resultproxy):
         return resultproxy.successful()
 
@@ -216,14 +302,10 @@ class PythonCallableAsyncBackend(object):
         return self.submit_callable(nullary)
 
 
-class MultiProcBackend(PythonCallableAsyncBackend):
-    def __init__(self, poolsize, packconfig_spec=None):
-        super(MultiProcBackend, self).__init__(packconfig_spec)
-        if poolsize == "auto":
-            poolsize = multiprocessing.cpu_count()
-
-        log.info("configured pool size to %s", poolsize)
-        self.pool = multiprocessing.Pool(int(poolsize))
+class MultiProcBackend(PoolBackendMixin, PythonCallableAsyncBackend):
+    def __init__(self, poolsize, packconfig_spec=None, start_method=None, shared=True):
+        PythonCallableAsyncBackend.__init__(self, packconfig_spec)
+        PoolBackendMixin.__init__(self, poolsize, start_method, shared)
 
     def submit_callable(self, callable):
         return PacktivityProxyBase(self.pool.apply_async(callable))
@@ -234,6 +316,10 @@ class MultiProcBackend(PythonCallableAsyncBackend):
     def ready(self, resultproxy):
         return resultproxy.proxy.ready()
 
+    def wait(self, resultproxy, timeout=None):
+        resultproxy.proxy.wait(timeout)
+        return resultproxy.proxy.ready()
+
     def successful(self, resultproxy):
         if not self.ready(resultproxy):
             return False
@@ -295,7 +381,9 @@ class ForegroundBackend(PythonCallableAsyncBackend):
         )
 
     def result(self, resultproxy):
-        return self.datamodel.create(resultproxy.resultdata, resultproxy.datamodel)
+        return self.datamodel.create(
+            resultproxy.resultdata, resultproxy.datamodel, normalized=True
+        )
 
     def ready(self, resultproxy):
         return True
@@ -309,6 +397,67 @@ class ForegroundBackend(PythonCallableAsyncBackend):
         pass
 
 
+class AsyncioProxy(PacktivityProxyBase):
+    """
+    proxy around an asyncio future. Awaiting it yields the result.
+    """
+
+    def __await__(self):
+        return self.proxy.__await__()
+
+
+class AsyncioBackend(PythonCallableAsyncBackend):
+    """
+    Backend to be used from within a running asyncio event loop. Packtivities
+    are run in the backend's own thread pool such that a single loop can drive
+    many of them concurrently, submit returns an awaitable proxy. At most
+    max_workers packtivities (by default PACKTIVITY_ASYNCIO_WORKERS or 256) run
+    at the same time, the others wait for a free thread. The threads mostly
+    block on subprocesses, so this is not tied to the number of CPUs as the
+    loop's default executor is.
+    """
+
+    def __init__(self, max_workers=None, packconfig_spec=None):
+        super(AsyncioBackend, self).__init__(packconfig_spec)
+        if not max_workers:
+            max_workers = os.environ.get("PACKTIVITY_ASYNCIO_WORKERS", 256)
+        self.max_workers = int(max_workers)
+        self.executor = concurrent.futures.ThreadPoolExecutor(self.max_workers)
+
+    def submit_callable(self, callable):
+        loop = asyncio.get_running_loop()
+        return AsyncioProxy(loop.run_in_executor(self.executor, callable))
+
+    def result(self, resultproxy):
+        return resultproxy.proxy.result()
+
+    def ready(self, resultproxy):
+        return resultproxy.proxy.done()
+
+    def successful(self, resultproxy):
+        if not self.ready(resultproxy) or resultproxy.proxy.cancelled():
+            return False
+        return resultproxy.proxy.exception() is None
+
+    def fail_info(self, resultproxy):
+        if not self.ready(resultproxy) or resultproxy.proxy.cancelled():
+            return None
+        exc = resultproxy.proxy.exception()
+        return (type(exc), exc) if exc else None
+
+    def close(self, wait=True):
+        """
+        shuts the thread pool down. wait: block until running packtivities finished
+        """
+        self.executor.shutdown(wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
 class IPythonParallelBackend(PythonCallableAsyncBackend):
     def __init__(self, client=None, resolve_like_partial=True, packconfig_spec=None):
         from ipyparallel import Client
@@ -340,6 +489,7 @@ class IPythonParallelBackend(PythonCallableAsyncBackend):
 
 try:
     from celery.result import AsyncResult as CeleryAsyncResult
+    from celery.exceptions import TimeoutError as CeleryTimeoutError
     from celery import Celery
     from celery import shared_task
 
@@ -400,6 +550,17 @@ try:
         def ready(self, resultproxy):
             return resultproxy.proxy.ready()
 
+        def wait(self, resultproxy, timeout=None):
+            try:
+                resultproxy.proxy.get(
+                    timeout=timeout,
+                    propagate=False,
+                    disable_sync_subtasks=self.disable_sync,
+                )
+            except CeleryTimeoutError:
+                pass
+            return resultproxy.proxy.ready()
+
         def successful(self, resultproxy):
             return resultproxy.proxy.successful()
 
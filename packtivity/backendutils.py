@@ -29,7 +29,7 @@ def external_loader(jsondata, deserialization_opts=None, best_effort_backend=Fal
 
     proxy = ExternalAsyncProxy.fromJSON(jsondata)
     if best_effort_backend:
-        _, backend = backend_from_string("externalasync")
+        _, backend = backend_from_string("externalasync:default")
         return proxy, backend
     return proxy
 
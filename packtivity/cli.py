@@ -5,9 +5,9 @@ import jsonschema
 import yaml
 import yadageschemas
 import logging
-import json
 
 import packtivity.utils as utils
+import packtivity.jsoncodec as jsoncodec
 import packtivity.backendutils as bkutils
 from .statecontexts.posixfs_context import LocalFSState
 
@@ -90,14 +90,14 @@ def runcli(
     result = pack(parameters, state, **backend_kwargs)
 
     if not is_sync and not asyncwait:
-        click.secho("proxy-json {}".format(json.dumps(result.json())))
+        click.secho("proxy-json {}".format(jsoncodec.dumps(result.json())))
         with open(proxyfile, "w") as p:
-            json.dump(result.json(), p)
+            p.write(jsoncodec.dumps(result.json()))
     else:
         click.echo(str(result) + (" (post-run)" if prepub else ""))
         if outfile:
             with open(outfile, "w") as out:
-                out.write(json.dumps(result.json()))
+                out.write(jsoncodec.dumps(result.json()))
 
 
 @click.command()
@@ -110,7 +110,7 @@ def validatecli(spec, toplevel, schemasource, schemaname, show):
     try:
         spec = utils.load_packtivity(spec, toplevel, schemasource, validate=True)
         if show:
-            click.echo(json.dumps(dict(spec)))
+            click.echo(jsoncodec.dumps(dict(spec)))
         else:
             click.secho("packtivity definition is valid", fg="green")
     except jsonschema.exceptions.ValidationError as e:
@@ -224,10 +224,41 @@ def shell(
     print(result)
 
 
+@utilcli.command()
+@click.option("-t", "--toplevel", default=os.getcwd())
+@click.option("-c", "--schemasource", default=yadageschemas.schemadir)
+@click.option("-v", "--verbosity", default="ERROR")
+@click.option("--validate/--no-validate", default=True)
+@click.option("-j", "--parallel", default=4, help="number of concurrent pulls")
+@click.argument("specs", nargs=-1, required=True)
+def prefetch(specs, toplevel, schemasource, verbosity, validate, parallel):
+    """
+    pulls the container images of a number of specs before running them.
+    configure a pull cache (PACKTIVITY_PULL_CACHE_DIR) so the steps skip their pulls.
+    """
+    from .handlers.execution_handlers import prefetch_images, spec_images
+    from .syncbackends import ExecutionConfig
+
+    logging.basicConfig(level=getattr(logging, verbosity))
+    specs = [
+        utils.load_packtivity(spec, toplevel, schemasource, validate) for spec in specs
+    ]
+    images = spec_images(specs)
+    failed = prefetch_images(ExecutionConfig(), images, parallel)
+    for image in images:
+        click.secho(
+            "{} {}".format("failed" if image in failed else "pulled", image),
+            fg="red" if image in failed else "green",
+        )
+    if failed:
+        raise click.ClickException("could not prefetch {} images".format(len(failed)))
+
+
 @click.command()
 @click.argument("jsonfile")
 def checkproxy(jsonfile):
-    proxydata = json.load(open(jsonfile))
+    with open(jsonfile) as f:
+        proxydata = jsoncodec.loads(f.read())
     proxy, backend = bkutils.load_proxy(proxydata, best_effort_backend=True)
 
     ready = backend.ready(proxy)
@@ -238,4 +269,4 @@ def checkproxy(jsonfile):
         click.secho("successful: {}".format(successful))
         if successful:
             result = backend.result(proxy)
-            click.secho("result: {}".format(json.dumps(result.json())))
+            click.secho("result: {}".format(jsoncodec.dumps(result.json())))
@@ -5,11 +5,15 @@ from packtivity.typedleafs import TypedLeafs
 assert PureJsonModel
 
 
-def create(data, model=None):
+def create(data, model=None, normalized=False):
     dmimpl = os.environ.get("PACKTIVITY_DATAMODEL_IMPL", "typedleafs")
     if dmimpl == "typedleafs":
-        return TypedLeafs(data, model)
+        return TypedLeafs(data, model, normalized=normalized)
     elif dmimpl == "purejson":
         return PureJsonModel(data, model)
+    elif dmimpl == "persistent":
+        from packtivity.datamodels.persistent import PersistentLeafs
+
+        return PersistentLeafs(data, model, normalized=normalized)
     else:
         raise RuntimeError("unknown implementation")
@@ -0,0 +1,111 @@
+import jsonpointer
+import pyrsistent
+
+from packtivity.typedleafs import TypedLeafs, get_leafmodel
+
+
+def set_in(node, parts, value):
+    """
+    persistent update of the value at a path (JSON pointer parts), returns the new node
+    """
+    if not parts:
+        return value
+    key = parts[0]
+    if isinstance(node, pyrsistent.PVector):
+        key = len(node) if key == "-" else int(key)
+        if key == len(node) and len(parts) == 1:
+            return node.append(value)
+    if len(parts) == 1:
+        return node.set(key, value)
+    if isinstance(node, pyrsistent.PVector):
+        child = node[key]
+    else:
+        # missing intermediate objects are created
+        child = node.get(key, pyrsistent.pmap())
+    return node.set(key, set_in(child, parts[1:], value))
+
+
+class PersistentLeafs(TypedLeafs):
+    """
+    TypedLeafs storing the data in pyrsistent maps and vectors. Copies are O(1)
+    and share all data, updates only create the O(log n) nodes along the changed
+    path, so that every intermediate version can be kept cheaply. The plain JSON
+    and typed views are materialized lazily and cached per version.
+    """
+
+    def __init__(self, data, leafmodel=None, idleafs=False, normalized=False):
+        self.leafmodel = leafmodel
+        self._leafmodel = get_leafmodel(leafmodel)
+        self._frozen = None
+        if isinstance(data, PersistentLeafs):
+            self._frozen = data.frozen()
+            self._views = {}
+            return
+        if isinstance(data, TypedLeafs):
+            data, normalized = data.json(), True
+        if not normalized:
+            data = TypedLeafs(data, leafmodel).json()
+        self._views = {"json": data}
+
+    def __repr__(self):
+        return "<PersistentLeafs: {}>".format(self.typed())
+
+    def frozen(self):
+        """
+        the data as persistent structure
+        """
+        if self._frozen is None:
+            self._frozen = pyrsistent.freeze(self._views["json"])
+        return self._frozen
+
+    def _update(self, frozen):
+        self._frozen = frozen
+        self._views = {}
+
+    def _view(self):
+        if "view" not in self._views:
+            self._views["view"] = TypedLeafs(
+                self.json(), self.leafmodel, normalized=True
+            )
+        return self._views["view"]
+
+    def __setitem__(self, key, value):
+        self.replace(jsonpointer.JsonPointer.from_parts([key]), value)
+
+    def __delitem__(self, key):
+        frozen = self.frozen()
+        if isinstance(frozen, pyrsistent.PVector):
+            self._update(frozen.delete(key))
+        else:
+            self._update(frozen.remove(key))
+
+    def replace(self, path, value):
+        self.replace_many([(path, value)])
+
+    def replace_many(self, replacements):
+        frozen = self.frozen()
+        for path, value in replacements:
+            value = pyrsistent.freeze(self._normalized_value(value))
+            frozen = set_in(frozen, path.parts, value)
+        self._update(frozen)
+
+    def json(self):
+        if "json" not in self._views:
+            self._views["json"] = pyrsistent.thaw(self._frozen)
+        return self._views["json"]
+
+    def typed(self, idleafs=False):
+        return self._view().typed(idleafs)
+
+    def copy(self):
+        copied = type(self).__new__(type(self))
+        copied.leafmodel = self.leafmodel
+        copied._leafmodel = self._leafmodel
+        copied._frozen = self.frozen()
+        # each copy materializes its own views when they are first needed
+        copied._views = {}
+        return copied
+
+    def jq(self, jq_program, *args, **kwargs):
+        result = self._view().jq(jq_program, *args, **kwargs)
+        return PersistentLeafs(result.json(), self.leafmodel, normalized=True)
@@ -1,9 +1,14 @@
-import copy
-import jq
-import jsonpointer
+import packtivity.utils as utils
 
 
 class PureJsonModel(object):
+    """
+    Datamodel of plain JSON data. Copies share the data, which must therefore
+    be treated as read-only wherever it is handed out (__getitem__, json(),
+    typed()). Changes go through __setitem__, __delitem__, replace and
+    replace_many, which only copy the containers along the changed path.
+    """
+
     def __repr__(self):
         return "<JSON {}>".format(self.data)
 
@@ -11,6 +16,9 @@ class PureJsonModel(object):
         if isinstance(data, PureJsonModel):
             data = data.json()
         self.data = data
+        # containers created by this instance, all others are shared and are
+        # copied before they are modified
+        self._owned = {}
 
     def __getitem__(self, key):
         return self.data.__getitem__(key)
@@ -22,18 +30,22 @@ class PureJsonModel(object):
         return self.data.__len__()
 
     def __delitem__(self, key):
+        self.data = utils.owned_copy(self.data, self._owned)
         self.data.__delitem__(key)
 
     def __setitem__(self, key, value):
-        data = self.data
-        data.__setitem__(key, value)
-        self.data = data
+        self.data = utils.owned_copy(self.data, self._owned)
+        self.data.__setitem__(key, value)
 
     def json(self):
         return self.data
 
     def copy(self):
-        return copy.deepcopy(self)
+        """
+        copy-on-write copy, the data is shared until either instance is modified
+        """
+        self._owned = {}
+        return PureJsonModel(self.data)
 
     def typed(self):
         return self.data
@@ -42,26 +54,26 @@ class PureJsonModel(object):
         return reference.get(self.typed())
 
     def jq(self, jq_program, *args, **kwargs):
-        return PureJsonModel(jq.jq(jq_program).transform(self.json(), *args, **kwargs))
+        return PureJsonModel(
+            utils.jq_program(jq_program).transform(self.json(), *args, **kwargs)
+        )
 
     def leafs(self):
-        if not isinstance(self.typed(), (list, dict)):
-            yield jsonpointer.JsonPointer(""), self.typed()
-        else:
-            ptrs = [
-                jsonpointer.JsonPointer.from_parts(parts)
-                for parts in self.jq("paths(scalars)", multiple_output=True).typed()
-            ]
-            for p in ptrs:
-                yield p, p.get(self.typed())
+        for p, v in utils.leaf_iterator(self.typed()):
+            yield p, v
 
     def replace(self, path, value):
-        self.data = path.set(self.json(), value, inplace=True)
+        self.data = utils.cow_set(self.data, path, value, self._owned)
+
+    def replace_many(self, replacements):
+        for path, value in replacements:
+            self.data = utils.cow_set(self.data, path, value, self._owned)
 
     def asrefs(self, callback=None):
-        data = self.copy().json()
+        # the data is shared, the references are set copy-on-write
+        data, owned = self.json(), {}
         for p, v in self.leafs():
             if p.path == "":
                 return p if not callback else callback(p)
-            p.set(data, p if not callback else callback(p))
+            data = utils.cow_set(data, p, p if not callback else callback(p), owned)
         return data
@@ -0,0 +1,244 @@
+import base64
+import http.client
+import json
+import logging
+import os
+import socket
+import struct
+import urllib.parse
+
+log = logging.getLogger(__name__)
+
+
+DEFAULT_REGISTRY = "https://index.docker.io/v1/"
+
+
+def default_socket_path():
+    """
+    the engine's unix socket. None if DOCKER_HOST points to a non-unix
+    (e.g. tcp://) endpoint, which only the docker CLI is set up to talk to.
+    """
+    docker_host = os.environ.get("DOCKER_HOST", "")
+    if docker_host.startswith("unix://"):
+        return docker_host[len("unix://") :]
+    if docker_host:
+        return None
+    return "/var/run/docker.sock"
+
+
+def image_registry(image):
+    """
+    the registry an image reference points to, as keyed in the docker config
+    """
+    first, sep, _ = image.partition("/")
+    if sep and ("." in first or ":" in first or first == "localhost"):
+        return first
+    return DEFAULT_REGISTRY
+
+
+def docker_config():
+    path = os.path.join(
+        os.environ.get("DOCKER_CONFIG", os.path.expanduser("~/.docker")),
+        "config.json",
+    )
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def credential_helper(image, config=None):
+    """
+    the credential helper (or store) holding the credentials of the image's
+    registry, if any. Those credentials are only accessible through the CLI.
+    """
+    config = docker_config() if config is None else config
+    registry = image_registry(image)
+    helpers = config.get("credHelpers", {})
+    return helpers.get(registry) or config.get("credsStore")
+
+
+def registry_auth(image, config=None):
+    """
+    the X-Registry-Auth header value for pulling image with the credentials
+    stored in the docker config, None if there are none
+    """
+    config = docker_config() if config is None else config
+    registry = image_registry(image)
+    auths = config.get("auths", {})
+    entry = auths.get(registry)
+    if entry is None:
+        # entries may be keyed by URL rather than by host name
+        for key, value in auths.items():
+            if urllib.parse.urlparse(key).netloc == registry:
+                entry = value
+                break
+    if not entry:
+        return None
+    if entry.get("identitytoken"):
+        auth = {"identitytoken": entry["identitytoken"]}
+    elif entry.get("auth"):
+        username, _, password = (
+            base64.b64decode(entry["auth"]).decode("utf-8").partition(":")
+        )
+        auth = {"username": username, "password": password}
+    else:
+        return None
+    auth["serveraddress"] = registry
+    return base64.urlsafe_b64encode(json.dumps(auth).encode("utf-8")).decode("ascii")
+
+
+class DockerEngineError(RuntimeError):
+    def __init__(self, status, message):
+        super(DockerEngineError, self).__init__(
+            "docker engine error {}: {}".format(status, message)
+        )
+        self.status = status
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path, timeout=None):
+        super(UnixHTTPConnection, self).__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+
+def demultiplex(sock, buffered=b""):
+    """
+    yields (stream, data) frames of a non-TTY attach stream
+    (stream 1 is stdout, 2 is stderr)
+    """
+    buf = buffered
+    while True:
+        while len(buf) < 8:
+            chunk = sock.recv(65536)
+            if not chunk:
+                return
+            buf += chunk
+        stream, size = struct.unpack(">BxxxL", buf[:8])
+        while len(buf) < 8 + size:
+            chunk = sock.recv(65536)
+            if not chunk:
+                return
+            buf += chunk
+        yield stream, buf[8 : 8 + size]
+        buf = buf[8 + size :]
+
+
+class DockerEngineClient(object):
+    """
+    Minimal client of the Docker Engine HTTP API on a unix socket, covering
+    what is needed to run a step: pull, create, attach, start, wait and remove.
+    """
+
+    def __init__(self, socket_path=None, timeout=None):
+        self.socket_path = socket_path or default_socket_path()
+        if self.socket_path is None:
+            raise DockerEngineError(
+                None,
+                "DOCKER_HOST {} is not a unix socket".format(
+                    os.environ.get("DOCKER_HOST")
+                ),
+            )
+        self.timeout = timeout
+
+    def request(self, method, path, params=None, body=None, headers=None):
+        url = path
+        if params:
+            url += "?" + urllib.parse.urlencode(params)
+        headers = dict(headers or {})
+        if body is not None:
+            body = json.dumps(body)
+            headers["Content-Type"] = "application/json"
+        conn = UnixHTTPConnection(self.socket_path, self.timeout)
+        conn.request(method, url, body=body, headers=headers)
+        response = conn.getresponse()
+        if response.status >= 400:
+            data = response.read()
+            conn.close()
+            try:
+                message = json.loads(data)["message"]
+            except (ValueError, KeyError, TypeError):
+                message = data.decode("utf-8", "replace")
+            raise DockerEngineError(response.status, message)
+        return conn, response
+
+    def call(self, method, path, params=None, body=None):
+        conn, response = self.request(method, path, params, body)
+        try:
+            data = response.read()
+        finally:
+            conn.close()
+        return json.loads(data) if data else None
+
+    def pull(self, image, auth=None):
+        """
+        pulls an image. auth: X-Registry-Auth header value (see registry_auth)
+        """
+        headers = {"X-Registry-Auth": auth} if auth else None
+        conn, response = self.request(
+            "POST", "/images/create", {"fromImage": image}, headers=headers
+        )
+        try:
+            for line in iter(response.readline, b""):
+                if not line.strip():
+                    continue
+                message = json.loads(line)
+                if "error" in message:
+                    raise DockerEngineError(response.status, message["error"])
+                log.debug("pull %s: %s", image, message.get("status"))
+        finally:
+            conn.close()
+
+    def create(self, config):
+        return self.call("POST", "/containers/create", body=config)["Id"]
+
+    def attach(self, cid, stdin=False):
+        """
+        attaches to a container's output (and optionally input) streams.
+        returns the hijacked socket and any output already read with the headers.
+        """
+        params = {"stream": 1, "stdout": 1, "stderr": 1}
+        if stdin:
+            params["stdin"] = 1
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        sock.sendall(
+            (
+                "POST /containers/{}/attach?{} HTTP/1.1\r\n"
+                "Host: localhost\r\n"
+                "Connection: Upgrade\r\n"
+                "Upgrade: tcp\r\n\r\n"
+            )
+            .format(cid, urllib.parse.urlencode(params))
+            .encode("utf-8")
+        )
+        buf = b""
+        while b"\r\n\r\n" not in buf:
+            chunk = sock.recv(4096)
+            if not chunk:
+                sock.close()
+                raise DockerEngineError(None, "attach connection closed")
+            buf += chunk
+        head, rest = buf.split(b"\r\n\r\n", 1)
+        status = int(head.split(b"\r\n")[0].split()[1])
+        if status not in (101, 200):
+            sock.close()
+            raise DockerEngineError(status, "could not attach to {}".format(cid))
+        return sock, rest
+
+    def start(self, cid):
+        self.call("POST", "/containers/{}/start".format(cid))
+
+    def wait(self, cid):
+        return self.call("POST", "/containers/{}/wait".format(cid))["StatusCode"]
+
+    def remove(self, cid):
+        self.call("DELETE", "/containers/{}".format(cid), {"force": 1})
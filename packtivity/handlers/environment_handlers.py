@@ -1,5 +1,4 @@
 import packtivity.utils as utils
-import jq
 import copy
 
 handlers, environment = utils.handler_decorator()
@@ -18,7 +17,9 @@ def docker(environment, parameters, state):
 
     for i, x in enumerate(environment["par_mounts"]):
         script = x.pop("jqscript")
-        x["mountcontent"] = jq.jq(script).transform(jsonpars, text_output=True)
+        x["mountcontent"] = utils.jq_program(script).transform(
+            jsonpars, text_output=True
+        )
 
     if environment["workdir"] is not None:
         environment["workdir"] = state.contextualize_value(environment["workdir"])
@@ -1,9 +1,14 @@
+import atexit
 import os
+import selectors
 import subprocess
 import sys
-import time
 import shlex
 import pipes
+import socket
+import time
+import concurrent.futures
+import logging
 
 import click
 import yaml
@@ -11,6 +16,11 @@ import json
 
 import packtivity.utils as utils
 import packtivity.logutils as logutils
+import packtivity.dockerapi as dockerapi
+from packtivity.dockerapi import DockerEngineClient, demultiplex
+from packtivity.pullcache import ImagePullCache
+import packtivity.warmcontainers as warmcontainers
+from packtivity.warmcontainers import WarmContainerPool
 
 handlers, executor = utils.handler_decorator()
 
@@ -166,6 +176,30 @@ resources: {resources}
     return options, mounts
 
 
+def docker_env_flags(race_spec):
+    if "env" in race_spec:
+        return " ".join(
+            [
+                f"-e {env_entry['name']}='{env_entry['value']}'"
+                for env_entry in race_spec["env"]
+            ]
+        )
+    return ""
+
+
+def docker_mount_flags(race_spec):
+    mount_args = ""
+    for s in race_spec["mounts"]:
+        suffix = "ro" if s["readonly"] else "rw"
+        if s.get("propagation"):
+            suffix += "," + s["propagation"]
+
+        mount_args += " -v {source}:{destination}:{suffix}".format(
+            source=s["source"], destination=s["destination"], suffix=suffix
+        )
+    return mount_args
+
+
 def docker_execution_cmdline(config, state, log, metadata, race_spec):
 
     # docker specific container id
@@ -177,15 +211,7 @@ def docker_execution_cmdline(config, state, log, metadata, race_spec):
     cid_file = "--cidfile {}".format(cidfile)
 
 
-    if "env" in race_spec:
-        env_vars = " ".join(
-            [
-                f"-e {env_entry['name']}='{env_entry['value']}'"
-                for env_entry in race_spec["env"]
-            ]
-        )
-    else:
-        env_vars = ""
+    env_vars = docker_env_flags(race_spec)
 
     # docker specific execution modifier
     custom_mod = " {}".format(config.container_config.container_runtime_modifier())
@@ -197,15 +223,7 @@ def docker_execution_cmdline(config, state, log, metadata, race_spec):
     workdir_flag = (
         "-w {}".format(race_spec["workdir"]) if race_spec["workdir"] is not None else ""
     )
-    mount_args = ""
-    for s in race_spec["mounts"]:
-        suffix = "ro" if s["readonly"] else "rw"
-        if s.get("propagation"):
-            suffix += "," + s["propagation"]
-
-        mount_args += " -v {source}:{destination}:{suffix}".format(
-            source=s["source"], destination=s["destination"], suffix=suffix
-        )
+    mount_args = docker_mount_flags(race_spec)
 
     return "docker run --rm {stdin} {tty} {cid} {workdir} {env_vars} {custom} {mount_args} {image} {command}".format(
         stdin="-i" if race_spec["stdin"] or race_spec["tty"] else "",
@@ -282,6 +300,38 @@ command: {command}
     return ["sh", "-c", in_docker_cmd], None, False
 
 
+def tail_subprocesses(procs_and_logs):
+    """
+    tails the stdout of a number of (subprocess, logger) pairs from a single
+    thread, logging each line as it arrives, and waits for all processes to exit.
+    returns the list of return codes.
+    """
+    sel = selectors.DefaultSelector()
+    for proc, log in procs_and_logs:
+        sel.register(proc.stdout, selectors.EVENT_READ, (log, [b""]))
+
+    while sel.get_map():
+        for key, _ in sel.select():
+            log, pending = key.data
+            chunk = os.read(key.fd, 65536)
+            if not chunk:
+                sel.unregister(key.fileobj)
+                if pending[0]:
+                    log.info(pending[0].strip())
+                continue
+            lines = (pending[0] + chunk).split(b"\n")
+            pending[0] = lines.pop()
+            for line in lines:
+                log.info(line.strip())
+    sel.close()
+
+    returncodes = []
+    for proc, _ in procs_and_logs:
+        returncodes.append(proc.wait())
+        proc.stdout.close()
+    return returncodes
+
+
 def execute_and_tail_subprocess(
     config,
     metadata,
@@ -323,13 +373,7 @@ def execute_and_tail_subprocess(
                 )
 
             log.debug("started subprocess with pid %s. now wait to finish", proc.pid)
-            time.sleep(0.5)
-
-            for line in iter(proc.stdout.readline, b""):
-                subproclog.info(line.strip())
-            while proc.poll() is None:
-                pass
-            proc.stdout.close()
+            tail_subprocesses([(proc, subproclog)])
         log.debug(
             "container execution subprocess finished. return code: %s", proc.returncode
         )
@@ -394,18 +438,256 @@ def race_spec(config, state, environment, log, job):
     }
 
 
-def run_containers_in_docker_runtime(config, state, log, metadata, race_spec):
-    if config.container_config.pull_software():
+def pull_image(config, state, log, metadata, image, pull=None):
+    """
+    pulls an image, skipping the pull if the node's pull cache (if configured)
+    has a recent enough record of it. pull: alternative callable doing the pull
+    """
+
+    def cli_pull():
         execute_and_tail_subprocess(
             config,
             metadata,
             state,
             log,
-            "docker pull {}".format(race_spec["image"]),
+            "docker pull {}".format(image),
             logging_topic="pull",
         )
 
+    pull = pull or cli_pull
+
+    location = config.container_config.pull_cache_location()
+    start = time.time()
+    if location and not config.dry_run():
+        cache = ImagePullCache(location, config.container_config.pull_cache_ttl())
+        pulled = cache.ensure(image, pull)
+    else:
+        pull()
+        pulled = True
+    duration = time.time() - start
+
+    with logutils.setup_logging_topic(
+        config, metadata, state, "pull", return_logger=True
+    ) as pulllog:
+        if pulled:
+            pulllog.info("pulled image %s in %.2fs", image, duration)
+        else:
+            pulllog.info("skipped pull of cached image %s (%.2fs)", image, duration)
+
+
+def spec_images(specs):
+    """
+    the distinct container images (image:tag) used by a number of packtivity specs
+    """
+    images = set()
+    for spec in specs:
+        environment = spec.get("environment") or {}
+        if environment.get("environment_type") != "docker-encapsulated":
+            continue
+        images.add(
+            ":".join([environment["image"], environment.get("imagetag", "latest")])
+        )
+    return sorted(images)
+
+
+def prefetch_images(config, images, parallel=4):
+    """
+    pulls a number of images concurrently (at most parallel at a time) ahead of
+    the steps using them. returns the list of images that could not be pulled.
+    """
+    log = logging.getLogger(__name__)
+
+    def pull(image):
+        # the pulls run concurrently, each logs under its own (image) name
+        metadata = {"name": "prefetch.{}".format(image)}
+        pull_image(config, None, log.getChild(image), metadata, image)
+
+    failed = []
+    with concurrent.futures.ThreadPoolExecutor(max(int(parallel), 1)) as pool:
+        futures = {pool.submit(pull, image): image for image in images}
+        for future in concurrent.futures.as_completed(futures):
+            if future.exception():
+                log.error(
+                    "could not prefetch image %s",
+                    futures[future],
+                    exc_info=future.exception(),
+                )
+                failed.append(futures[future])
+    return sorted(failed)
+
+
+_warm_pools = {}
+
+
+def warm_container_owner():
+    return "{}:{}".format(socket.gethostname(), os.getpid())
+
+
+def sweep_warm_containers(log):
+    """
+    removes warm containers left behind by processes of this host that are gone
+    """
+    try:
+        listing = subprocess.check_output(
+            [
+                "docker",
+                "ps",
+                "--filter",
+                "label={}".format(warmcontainers.LABEL),
+                "--format",
+                '{{{{.ID}}}} {{{{.Label "{}"}}}}'.format(warmcontainers.LABEL),
+            ],
+            stderr=subprocess.DEVNULL,
+        ).decode("utf-8")
+    except (OSError, subprocess.CalledProcessError):
+        log.debug("could not list warm containers")
+        return []
+    swept = []
+    for line in listing.splitlines():
+        cid, _, owner = line.partition(" ")
+        host, _, pid = owner.rpartition(":")
+        if host != socket.gethostname() or not pid.isdigit():
+            continue
+        try:
+            os.kill(int(pid), 0)
+            continue
+        except ProcessLookupError:
+            pass
+        except PermissionError:
+            continue
+        log.info("removing orphaned warm container %s", cid)
+        subprocess.call(
+            ["docker", "rm", "-f", cid],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        swept.append(cid)
+    return swept
+
+
+def warm_container_running(cid):
+    try:
+        state = subprocess.check_output(
+            ["docker", "inspect", "-f", "{{.State.Running}}", cid],
+            stderr=subprocess.DEVNULL,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        # removed (--rm) once it exited
+        return False
+    return state.decode("utf-8").strip() == "true"
+
+
+def warm_container_pool(config, log=None):
+    """
+    the process-wide pool of warm containers for the pool settings of config
+    """
+    idle_timeout = config.container_config.warm_idle_timeout()
+    max_reuses = config.container_config.warm_max_reuses()
+    key = (idle_timeout, max_reuses)
+    if key not in _warm_pools:
+        if not _warm_pools:
+            sweep_warm_containers(log or logging.getLogger(__name__))
+
+        def remove(cid):
+            subprocess.check_call(
+                ["docker", "rm", "-f", cid],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+
+        pool = WarmContainerPool(
+            remove,
+            idle_timeout=idle_timeout,
+            max_reuses=max_reuses,
+            alive=warm_container_running,
+        )
+        atexit.register(pool.close)
+        _warm_pools[key] = pool
+    return _warm_pools[key]
+
+
+def warm_container_signature(config, race_spec):
+    mounts = sorted(
+        (m["source"], m["destination"], bool(m["readonly"]), m.get("propagation"))
+        for m in race_spec["mounts"]
+    )
+    return json.dumps(
+        [
+            race_spec["image"],
+            mounts,
+            config.container_config.container_runtime_modifier(),
+        ]
+    )
+
+
+def start_warm_container(config, log, race_spec):
+    # the pool evicts idle containers before they exit on their own
+    command = warmcontainers.keepalive_command(
+        config.container_config.warm_idle_timeout() + warmcontainers.KEEPALIVE_MARGIN
+    )
+    label = "{}={}".format(warmcontainers.LABEL, warm_container_owner())
+    cmdline = "docker run -d --rm --label {label} {custom} {mount_args} {image} {cmd}"
+    cmdline = cmdline.format(
+        label=pipes.quote(label),
+        custom=config.container_config.container_runtime_modifier(),
+        mount_args=docker_mount_flags(race_spec),
+        image=race_spec["image"],
+        cmd=" ".join(map(pipes.quote, command)),
+    )
+    log.debug("starting warm container: %s", cmdline)
+    return subprocess.check_output(shlex.split(cmdline)).decode("utf-8").strip()
+
+
+def docker_exec_cmdline(config, cid, race_spec):
+    workdir_flag = (
+        "-w {}".format(race_spec["workdir"]) if race_spec["workdir"] is not None else ""
+    )
+    return "docker exec {stdin} {workdir} {env_vars} {cid} {command}".format(
+        stdin="-i" if race_spec["stdin"] else "",
+        workdir=workdir_flag,
+        env_vars=docker_env_flags(race_spec),
+        cid=cid,
+        command=" ".join(
+            map(pipes.quote, warmcontainers.leased_command(race_spec["argv"]))
+        ),
+    )
+
+
+def run_in_warm_container(config, state, log, metadata, race_spec):
+    """
+    runs a job via docker exec in a warm container with the same image and mounts
+    """
+    pool = warm_container_pool(config, log)
+    container = pool.acquire(
+        warm_container_signature(config, race_spec),
+        [m["source"] for m in race_spec["mounts"] if m["type"] == "bind"],
+        lambda: start_warm_container(config, log, race_spec),
+    )
+    log.debug("using warm container %s (uses: %s)", container.cid, container.uses)
+    reusable = False
+    try:
+        execute_and_tail_subprocess(
+            config,
+            metadata,
+            state,
+            log,
+            docker_exec_cmdline(config, container.cid, race_spec),
+            stdin_content=race_spec["stdin"],
+            logging_topic="run",
+        )
+        reusable = True
+    finally:
+        # a failed job may leave processes behind, do not reuse the container
+        pool.release(container, reusable)
+
+
+def run_containers_in_docker_runtime(config, state, log, metadata, race_spec):
+    if config.container_config.pull_software():
+        pull_image(config, state, log, metadata, race_spec["image"])
+
     if not race_spec["tty"]:
+        if config.container_config.warm_containers() and not config.dry_run():
+            return run_in_warm_container(config, state, log, metadata, race_spec)
         cmdline = docker_execution_cmdline(config, state, log, metadata, race_spec)
         execute_and_tail_subprocess(
             config,
@@ -421,6 +703,123 @@ def run_containers_in_docker_runtime(config, state, log, metadata, race_spec):
         return cmdline
 
 
+def docker_api_container_config(race_spec):
+    binds = []
+    for s in race_spec["mounts"]:
+        suffix = "ro" if s["readonly"] else "rw"
+        if s.get("propagation"):
+            suffix += "," + s["propagation"]
+        binds.append("{}:{}:{}".format(s["source"], s["destination"], suffix))
+
+    stdin = bool(race_spec["stdin"])
+    return {
+        "Image": race_spec["image"],
+        "Cmd": race_spec["argv"],
+        "WorkingDir": race_spec["workdir"] or "",
+        "Env": [
+            "{}={}".format(e["name"], e["value"]) for e in race_spec.get("env", [])
+        ],
+        "AttachStdin": stdin,
+        "OpenStdin": stdin,
+        "StdinOnce": stdin,
+        "AttachStdout": True,
+        "AttachStderr": True,
+        "Tty": False,
+        "HostConfig": {"Binds": binds},
+    }
+
+
+def log_stream_lines(log, frames):
+    pending = {}
+    for stream, data in frames:
+        lines = (pending.get(stream, b"") + data).split(b"\n")
+        pending[stream] = lines.pop()
+        for line in lines:
+            log.info(line.strip())
+    for rest in pending.values():
+        if rest:
+            log.info(rest.strip())
+
+
+def engine_api_pull(config, log, client, image):
+    """
+    the pull callable for pull_image. None (i.e. the CLI pull) in dry runs and
+    for registries whose credentials are kept by a docker credential helper.
+    """
+    if config.dry_run():
+        return None
+    helper = dockerapi.credential_helper(image)
+    if helper:
+        log.debug("pulling %s via the CLI for credential helper %s", image, helper)
+        return None
+    return lambda: client.pull(image, dockerapi.registry_auth(image))
+
+
+def run_containers_via_engine_api(config, state, log, metadata, race_spec):
+    socket_path = config.container_config.docker_socket()
+    if not socket_path and dockerapi.default_socket_path() is None:
+        log.info("DOCKER_HOST is not a unix socket, running via the docker CLI")
+        return run_containers_in_docker_runtime(config, state, log, metadata, race_spec)
+    if config.container_config.container_runtime_modifier():
+        # arbitrary docker run flags cannot be mapped to a container config
+        log.info("docker command modifiers are set, running via the docker CLI")
+        return run_containers_in_docker_runtime(config, state, log, metadata, race_spec)
+
+    client = DockerEngineClient(socket_path)
+    if config.container_config.pull_software():
+        pull_image(
+            config,
+            state,
+            log,
+            metadata,
+            race_spec["image"],
+            pull=engine_api_pull(config, log, client, race_spec["image"]),
+        )
+
+    if race_spec["tty"]:
+        # interactive sessions need a terminal, leave those to the docker CLI
+        return docker_execution_cmdline(config, state, log, metadata, race_spec)
+
+    container_config = docker_api_container_config(race_spec)
+    log.debug("container config: %s", container_config)
+    if config.dry_run():
+        return
+
+    cid = client.create(container_config)
+    log.debug("created container %s", cid)
+    try:
+        with logutils.setup_logging_topic(
+            config, metadata, state, "run", return_logger=True
+        ) as runlog:
+            sock, buffered = client.attach(cid, stdin=container_config["OpenStdin"])
+            try:
+                client.start(cid)
+                if race_spec["stdin"]:
+                    sock.sendall(race_spec["stdin"].encode("utf-8"))
+                    sock.shutdown(socket.SHUT_WR)
+                log_stream_lines(runlog, demultiplex(sock, buffered))
+            finally:
+                sock.close()
+        returncode = client.wait(cid)
+    except BaseException:
+        # do not let a failing removal mask the original error
+        try:
+            client.remove(cid)
+        except Exception:
+            log.exception("could not remove container %s", cid)
+        raise
+    client.remove(cid)
+
+    log.debug("container %s finished. return code: %s", cid, returncode)
+    if returncode:
+        log.error("non-zero return code raising exception")
+        raise RuntimeError(
+            "failed container execution. container {} exited with code {}".format(
+                cid, returncode
+            )
+        )
+
+
 def run_containers_in_singularity_runtime(config, state, log, metadata, race_spec):
     import tempfile
     import shutil
@@ -467,6 +866,20 @@ def docker_enc_handler(config, environment, state, job, metadata):
         return result
 
 
+@executor("docker-encapsulated", "engineapi")
+def docker_engine_api_handler(config, environment, state, job, metadata):
+    if config.container_config.container_runtime() != "docker":
+        return docker_enc_handler(config, environment, state, job, metadata)
+
+    with logutils.setup_logging_topic(
+        config, metadata, state, "step", return_logger=True
+    ) as log:
+        rspec = race_spec(config, state, environment, log, job)
+
+        log.debug("rspec is\n{}".format(json.dumps(rspec, indent=4)))
+        return run_containers_via_engine_api(config, state, log, metadata, rspec)
+
+
 @executor("noop-env")
 def noop_env(config, environment, state, job, metadata):
     with logutils.setup_logging_topic(
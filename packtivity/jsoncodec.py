@@ -0,0 +1,114 @@
+import json
+import logging
+import math
+import os
+
+log = logging.getLogger(__name__)
+
+
+class StdlibCodec(object):
+    name = "json"
+
+    def dumps(self, obj, default=None, sort_keys=False):
+        return json.dumps(obj, default=default, sort_keys=sort_keys)
+
+    def loads(self, string, object_hook=None):
+        return json.loads(string, object_hook=object_hook)
+
+
+def has_nonfinite(obj):
+    """
+    whether a JSON-able structure contains NaN or +-Infinity
+    """
+    if isinstance(obj, float):
+        return not math.isfinite(obj)
+    if isinstance(obj, dict):
+        return any(has_nonfinite(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return any(has_nonfinite(v) for v in obj)
+    return False
+
+
+class OrjsonCodec(object):
+    """
+    orjson based codec. Whatever orjson cannot handle (e.g. integers beyond 64
+    bit, or NaN and Infinity which it would encode as null) as well as decoding
+    with an object_hook, for which the stdlib decoder is faster than
+    post-processing, is passed on to the stdlib codec.
+    """
+
+    name = "orjson"
+
+    def __init__(self):
+        import orjson
+
+        self.orjson = orjson
+        self.fallback = StdlibCodec()
+
+    def dumps(self, obj, default=None, sort_keys=False):
+        # leave dataclasses and datetimes to the default hook, as the stdlib does
+        option = (
+            self.orjson.OPT_NON_STR_KEYS
+            | self.orjson.OPT_PASSTHROUGH_DATACLASS
+            | self.orjson.OPT_PASSTHROUGH_DATETIME
+        )
+        if sort_keys:
+            option |= self.orjson.OPT_SORT_KEYS
+        converted = []
+
+        def checked_default(o):
+            value = default(o)
+            converted.append(value)
+            return value
+
+        try:
+            dumped = self.orjson.dumps(
+                obj, default=checked_default if default else None, option=option
+            )
+        except self.orjson.JSONEncodeError:
+            return self.fallback.dumps(obj, default=default, sort_keys=sort_keys)
+        # non-finite floats come out as null, only then the data needs a look
+        if b"null" in dumped and has_nonfinite([obj, converted]):
+            return self.fallback.dumps(obj, default=default, sort_keys=sort_keys)
+        return dumped.decode("utf-8")
+
+    def loads(self, string, object_hook=None):
+        if object_hook is not None:
+            return self.fallback.loads(string, object_hook=object_hook)
+        try:
+            return self.orjson.loads(string)
+        except self.orjson.JSONDecodeError:
+            return self.fallback.loads(string)
+
+
+codecs = {"json": StdlibCodec, "orjson": OrjsonCodec}
+
+
+def make_codec(name=None):
+    """
+    creates the named codec. Without a name the fastest available one is used.
+    """
+    if name:
+        return codecs[name]()
+    try:
+        return OrjsonCodec()
+    except ImportError:
+        return StdlibCodec()
+
+
+codec = make_codec(os.environ.get("PACKTIVITY_JSON_CODEC"))
+
+
+def use(name=None):
+    global codec
+    codec = make_codec(name)
+    log.debug("using JSON codec %s", codec.name)
+    return codec
+
+
+def dumps(obj, default=None, sort_keys=False):
+    return codec.dumps(obj, default=default, sort_keys=sort_keys)
+
+
+def loads(string, object_hook=None):
+    return codec.loads(string, object_hook=object_hook)
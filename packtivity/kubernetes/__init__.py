@@ -21,7 +21,9 @@ class DirectExternalKubernetesBackend(DirectJobMakerMixin, ExternalAsyncMixin):
         state = load_state(resultproxy.statedata, self.deserialization_opts)
 
         if resultproxy.resultdata is not None:
-            return self.datamodel.create(resultproxy.resultdata, state.datamodel)
+            return self.datamodel.create(
+                resultproxy.resultdata, state.datamodel, normalized=True
+            )
 
         parameters = self.datamodel.create(resultproxy.pardata, state.datamodel)
 
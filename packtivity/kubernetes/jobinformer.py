@@ -0,0 +1,107 @@
+import threading
+import logging
+
+from kubernetes import client, watch
+
+log = logging.getLogger(__name__)
+
+
+def label_selector(labels):
+    return ",".join("{}={}".format(k, v) for k, v in sorted(labels.items()))
+
+
+class JobStatusInformer(object):
+    """
+    Keeps an in-memory index of the status of all jobs matching a label selector.
+    The index is populated by a list call and then kept up to date by a watch
+    running in a background thread. The jobs are re-listed after every
+    resync_period seconds and whenever the watch's resourceVersion expired.
+    """
+
+    def __init__(
+        self,
+        batch_api,
+        namespace,
+        selector,
+        resync_period=300,
+        retry_period=5,
+        watch_factory=watch.Watch,
+    ):
+        self.batch_api = batch_api
+        self.namespace = namespace
+        self.selector = selector
+        self.resync_period = resync_period
+        self.retry_period = retry_period
+        self.watch_factory = watch_factory
+
+        self.index = {}
+        self.lock = threading.Lock()
+        self.synced = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+
+    def status(self, name):
+        """
+        returns the last seen status of a job or None if the job is not known
+        """
+        with self.lock:
+            return self.index.get(name)
+
+    def relist(self):
+        joblist = self.batch_api.list_namespaced_job(
+            self.namespace, label_selector=self.selector
+        )
+        with self.lock:
+            self.index = {j.metadata.name: j.status for j in joblist.items}
+        self.synced.set()
+        log.debug("synced %s jobs", len(joblist.items))
+        return joblist.metadata.resource_version
+
+    def handle_event(self, event):
+        job = event["object"]
+        with self.lock:
+            if event["type"] == "DELETED":
+                self.index.pop(job.metadata.name, None)
+            else:
+                self.index[job.metadata.name] = job.status
+        return job.metadata.resource_version
+
+    def watch_once(self):
+        """
+        lists the jobs and then watches them until the watch times out (i.e. the
+        next resync is due), the resourceVersion expired or the informer is stopped.
+        """
+        resource_version = self.relist()
+        w = self.watch_factory()
+        try:
+            for event in w.stream(
+                self.batch_api.list_namespaced_job,
+                self.namespace,
+                label_selector=self.selector,
+                resource_version=resource_version,
+                timeout_seconds=self.resync_period,
+            ):
+                resource_version = self.handle_event(event)
+                if self.stopped.is_set():
+                    w.stop()
+        except client.rest.ApiException as e:
+            if e.status != 410:
+                raise
+            log.debug("resource version %s expired", resource_version)
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                self.watch_once()
+            except Exception:
+                log.exception("job watch failed, retrying in %ss", self.retry_period)
+                self.stopped.wait(self.retry_period)
@@ -1,13 +1,35 @@
-from kubernetes import client, config
+from kubernetes import client, config, watch
+import concurrent.futures
 import logging
+import socket
+
+import urllib3
+
+from .jobinformer import JobStatusInformer, label_selector
 
 log = logging.getLogger(__name__)
 
 
+def missing_job_status(name):
+    # the job is gone and will never finish, report it as failed
+    log.warning("job %s does not exist", name)
+    return client.V1JobStatus(failed=1)
+
+
 class SubmitToKubeMixin(object):
     def __init__(self, **kwargs):
         self.svcaccount = kwargs.get("svcaccount", "default")
         self.namespace = kwargs.get("namespace", "default")
+        self.use_informer = kwargs.get("job_informer", False)
+        self.informer_sync_timeout = kwargs.get("informer_sync_timeout", 10)
+        self.informer = None
+        # resources are created concurrently and cleaned up in the background
+        self.submit_executor = concurrent.futures.ThreadPoolExecutor(
+            int(kwargs.get("submit_workers", 4))
+        )
+        self.cleanup_executor = concurrent.futures.ThreadPoolExecutor(
+            int(kwargs.get("cleanup_workers", 2))
+        )
         if kwargs.get("kubeconfig") == "incluster":
             log.info("load incluster config")
             config.load_incluster_config()
@@ -18,75 +40,135 @@ class SubmitToKubeMixin(object):
                 config.load_kube_config()
             else:
                 config.load_kube_config(cfg)
-            import urllib3
-
             urllib3.disable_warnings()
 
+        # long-lived API clients sharing one (thread-safe) connection pool
+        self.api_client = client.ApiClient(self.api_configuration(**kwargs))
+        self.batch_api = client.BatchV1Api(self.api_client)
+        self.core_api = client.CoreV1Api(self.api_client)
+
+    def api_configuration(self, **kwargs):
+        configuration = client.Configuration.get_default_copy()
+        if kwargs.get("connection_pool_size"):
+            configuration.connection_pool_maxsize = int(kwargs["connection_pool_size"])
+        if kwargs.get("keep_alive", True):
+            from urllib3.connection import HTTPConnection
+
+            configuration.socket_options = HTTPConnection.default_socket_options + [
+                (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            ]
+        return configuration
+
     def create_kube_resources(self, resources):
-        for r in resources:
-            if r["kind"] == "Job":
-                thejob = client.V1Job(
-                    kind=r["kind"],
-                    api_version=r["apiVersion"],
-                    metadata=r["metadata"],
-                    spec=r["spec"],
-                )
-                client.BatchV1Api().create_namespaced_job(self.namespace, thejob)
-                log.info("created job %s", r["metadata"]["name"])
-            elif r["kind"] == "ConfigMap":
-                cm = client.V1ConfigMap(
-                    api_version="v1",
-                    kind=r["kind"],
-                    metadata={
-                        "name": r["metadata"]["name"],
-                        "namespace": self.namespace,
-                        "labels": self.resource_labels,
-                    },
-                    data=r["data"],
-                )
-                client.CoreV1Api().create_namespaced_config_map(self.namespace, cm)
-                log.info("created configmap %s", r["metadata"]["name"])
+        """
+        creates the job first and then, concurrently, the other resources owned
+        by the job (the job's pods wait for their configmaps to appear). Already
+        created resources are deleted again if any of them fails.
+        """
+        jobs = [r for r in resources if r["kind"] == "Job"]
+        others = [r for r in resources if r["kind"] != "Job"]
+        created, owners = [], []
+        try:
+            for r in jobs:
+                owners.append(self.create_kube_resource(r))
+                created.append(r)
+            futures = [
+                (r, self.submit_executor.submit(self.create_kube_resource, r, owners))
+                for r in others
+            ]
+            error = None
+            for r, f in futures:
+                try:
+                    f.result()
+                    created.append(r)
+                except Exception as e:
+                    error = error or e
+            if error is not None:
+                raise error
+        except Exception:
+            log.exception("could not create resources, deleting the created ones")
+            self.delete_created_resources(created)
+            raise
+
+    def create_kube_resource(self, r, owners=None):
+        if r["kind"] == "Job":
+            thejob = client.V1Job(
+                kind=r["kind"],
+                api_version=r["apiVersion"],
+                metadata=r["metadata"],
+                spec=r["spec"],
+            )
+            created = self.batch_api.create_namespaced_job(self.namespace, thejob)
+            log.info("created job %s", r["metadata"]["name"])
+            return created
+        elif r["kind"] == "ConfigMap":
+            cm = client.V1ConfigMap(
+                api_version="v1",
+                kind=r["kind"],
+                metadata={
+                    "name": r["metadata"]["name"],
+                    "namespace": self.namespace,
+                    "labels": self.resource_labels,
+                    # garbage collected together with the job
+                    "ownerReferences": [
+                        {
+                            "apiVersion": "batch/v1",
+                            "kind": "Job",
+                            "name": owner.metadata.name,
+                            "uid": owner.metadata.uid,
+                        }
+                        for owner in owners or []
+                    ],
+                },
+                data=r["data"],
+            )
+            self.core_api.create_namespaced_config_map(self.namespace, cm)
+            log.info("created configmap %s", r["metadata"]["name"])
 
     def get_k8s_job_log(self, jobname):
-        pods = client.CoreV1Api().list_namespaced_pod(
+        pods = self.core_api.list_namespaced_pod(
             self.namespace, label_selector="job-name={}".format(jobname)
         )
         pods = pods.to_dict()["items"]
         podname = pods[0]["metadata"]["name"]
 
         try:
-            logs = client.CoreV1Api().read_namespaced_pod_log(podname, self.namespace)
+            logs = self.core_api.read_namespaced_pod_log(podname, self.namespace)
         except client.rest.ApiException:
             pass
         return logs
 
     def delete_created_resources(self, resources):
         for r in resources:
-            if r["kind"] == "Job":
-                resource_name = r["metadata"]["name"]
-                try:
-                    client.BatchV1Api().delete_namespaced_job(
-                        resource_name, self.namespace
-                    )
-                except client.rest.ApiException:
-                    pass
+            self.delete_kube_resource(r)
 
-                try:
-                    client.CoreV1Api().delete_collection_namespaced_pod(
-                        self.namespace,
-                        label_selector="job-name={}".format(resource_name),
-                    )
-                except client.rest.ApiException:
-                    pass
+    def schedule_cleanup(self, resources):
+        """
+        deletes resources asynchronously on the cleanup workers
+        """
+        for r in resources:
+            try:
+                self.cleanup_executor.submit(self.delete_kube_resource, r)
+            except RuntimeError:
+                # the cleanup workers were shut down by close()
+                self.delete_kube_resource(r)
 
+    def delete_kube_resource(self, r):
+        resource_name = r["metadata"]["name"]
+        try:
+            if r["kind"] == "Job":
+                # background propagation lets the garbage collector remove the pods
+                self.batch_api.delete_namespaced_job(
+                    resource_name, self.namespace, propagation_policy="Background"
+                )
             elif r["kind"] == "ConfigMap":
-                resource_name = r["metadata"]["name"]
-                try:
-                    client.CoreV1Api().delete_namespaced_config_map(
-                        resource_name, self.namespace, client.V1DeleteOptions()
-                    )
-                except client.rest.ApiException:
-                    pass
+                self.core_api.delete_namespaced_config_map(
+                    resource_name, self.namespace, body=client.V1DeleteOptions()
+                )
+        except client.rest.ApiException:
+            pass
+        except Exception:
+            log.exception("could not delete %s %s", r["kind"], resource_name)
 
     def submit(self, jobspec):
         proxy_data, kube_resources = self.plan_kube_resources(jobspec)
@@ -94,23 +176,123 @@ class SubmitToKubeMixin(object):
         return proxy_data
 
     def ready(self, job_proxy):
-        ready = self.determine_readiness(job_proxy)
+        return self.handle_readiness(job_proxy, self.determine_readiness(job_proxy))
+
+    def ready_many(self, job_proxies):
+        """
+        readiness of many job proxies at once. The statuses of all pending jobs
+        are fetched with a single (paginated) list call instead of one read each.
+        """
+        pending = [p for p in job_proxies if not p.get("ready", False)]
+        statuses = {}
+        if pending and not self.use_informer:
+            statuses = self.list_k8s_job_statuses()
+        readiness = []
+        for job_proxy in job_proxies:
+            if job_proxy.get("ready", False):
+                ready = True
+            elif self.use_informer:
+                ready = self.determine_readiness(job_proxy)
+            else:
+                # jobs are submitted synchronously, missing ones were deleted
+                jobstatus = statuses.get(job_proxy["job_id"]) or missing_job_status(
+                    job_proxy["job_id"]
+                )
+                ready = self.update_readiness(job_proxy, jobstatus)
+            readiness.append(self.handle_readiness(job_proxy, ready))
+        return readiness
+
+    def handle_readiness(self, job_proxy, ready):
         if ready and not "ready" in job_proxy:
             log.debug("is first time ready %s", job_proxy["job_id"])
             job_proxy["ready"] = ready
             if job_proxy["last_success"]:
                 log.debug("is first success %s delete resources", job_proxy["job_id"])
-                self.delete_created_resources(job_proxy["resources"])
+                self.schedule_cleanup(job_proxy["resources"])
         return ready
 
+    def wait(self, job_proxy, timeout=None):
+        """
+        blocks on a watch of the job until it finished or timeout seconds passed.
+        with the job informer enabled the status index is checked instead.
+        """
+        if not job_proxy.get("ready", False) and not self.use_informer:
+            w = watch.Watch()
+            try:
+                for event in w.stream(
+                    self.batch_api.list_namespaced_job,
+                    self.namespace,
+                    field_selector="metadata.name={}".format(job_proxy["job_id"]),
+                    timeout_seconds=(
+                        max(int(timeout), 1) if timeout is not None else None
+                    ),
+                ):
+                    status = event["object"].status
+                    if status.succeeded or status.failed:
+                        w.stop()
+            except (
+                client.rest.ApiException,
+                urllib3.exceptions.ProtocolError,
+                urllib3.exceptions.ReadTimeoutError,
+            ) as e:
+                # e.g. an expired resourceVersion (410) or a dropped connection,
+                # the caller polls instead
+                log.debug("watch of job %s failed: %s", job_proxy["job_id"], e)
+        return self.ready(job_proxy)
+
     def successful(self, job_proxy):
         return job_proxy["last_success"]
 
     def fail_info(self, resultproxy):
         pass
 
+    def job_informer(self):
+        if self.informer is None:
+            self.informer = JobStatusInformer(
+                self.batch_api,
+                self.namespace,
+                label_selector(self.resource_labels),
+            ).start()
+            # block for the initial sync only once, later checks do not wait
+            if not self.informer.synced.wait(self.informer_sync_timeout):
+                log.warning("job informer not synced, reading jobs directly")
+        return self.informer
+
+    def close(self):
+        if self.informer is not None:
+            self.informer.stop()
+            self.informer = None
+        self.submit_executor.shutdown()
+        self.cleanup_executor.shutdown()
+        self.api_client.close()
+
     def check_k8s_job_status(self, name):
-        return client.BatchV1Api().read_namespaced_job(name, self.namespace).status
+        if self.use_informer:
+            informer = self.job_informer()
+            status = informer.status(name) if informer.synced.is_set() else None
+            if status is not None:
+                return status
+            # not synced yet or not (yet) seen by the watch
+            log.debug("job %s not in the informer index, reading it directly", name)
+        try:
+            return self.batch_api.read_namespaced_job(name, self.namespace).status
+        except client.rest.ApiException as e:
+            if e.status != 404:
+                raise
+            return missing_job_status(name)
+
+    def list_k8s_job_statuses(self, page_size=500):
+        statuses = {}
+        kwargs = {"label_selector": label_selector(self.resource_labels)}
+        while True:
+            joblist = self.batch_api.list_namespaced_job(
+                self.namespace, limit=page_size, **kwargs
+            )
+            for job in joblist.items:
+                statuses[job.metadata.name] = job.status
+            if not joblist.metadata._continue:
+                return statuses
+            kwargs["_continue"] = joblist.metadata._continue
 
     def determine_readiness(self, job_proxy):
         ready = job_proxy.get("ready", False)
@@ -119,8 +301,11 @@ class SubmitToKubeMixin(object):
 
         log.debug("actually checking job %s", job_proxy["job_id"])
 
+        jobstatus = self.check_k8s_job_status(job_proxy["job_id"])
+        return self.update_readiness(job_proxy, jobstatus)
+
+    def update_readiness(self, job_proxy, jobstatus):
         job_id = job_proxy["job_id"]
-        jobstatus = self.check_k8s_job_status(job_id)
         job_proxy["last_success"] = jobstatus.succeeded
         job_proxy["last_failed"] = jobstatus.failed
         ready = job_proxy["last_success"] or job_proxy["last_failed"]
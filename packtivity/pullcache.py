@@ -0,0 +1,82 @@
+import contextlib
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+
+log = logging.getLogger(__name__)
+
+
+def pinned(image):
+    """
+    whether an image reference is pinned to a (immutable) digest
+    """
+    return "@" in image
+
+
+class ImagePullCache(object):
+    """
+    Node-local record of recently pulled container images. An image pulled less
+    than ttl seconds ago (or ever, for digest-pinned images) is not pulled again.
+    Concurrent pulls of the same image, also across processes, are serialized
+    through a file lock so that only one of them hits the registry.
+    """
+
+    def __init__(self, location, ttl=3600):
+        self.location = location
+        self.ttl = ttl
+
+    def path(self, image, suffix):
+        key = hashlib.sha1(image.encode("utf-8")).hexdigest()
+        return os.path.join(self.location, "{}.{}".format(key, suffix))
+
+    def record(self, image):
+        try:
+            with open(self.path(image, "json")) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def fresh(self, image):
+        record = self.record(image)
+        if record is None:
+            return False
+        return pinned(image) or time.time() - record["pulled"] < self.ttl
+
+    @contextlib.contextmanager
+    def lock(self, image):
+        if not os.path.exists(self.location):
+            os.makedirs(self.location, exist_ok=True)
+        with open(self.path(image, "lock"), "w") as lockfile:
+            fcntl.flock(lockfile, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lockfile, fcntl.LOCK_UN)
+
+    def store(self, image, duration):
+        record = {"image": image, "pulled": time.time(), "duration": duration}
+        fd, tmpname = tempfile.mkstemp(dir=self.location)
+        with os.fdopen(fd, "w") as f:
+            json.dump(record, f)
+        os.replace(tmpname, self.path(image, "json"))
+
+    def ensure(self, image, pull):
+        """
+        calls pull() unless the image was pulled recently.
+        returns whether the image was actually pulled.
+        """
+        if self.fresh(image):
+            return False
+        with self.lock(image):
+            # another step may have pulled while we were waiting for the lock
+            if self.fresh(image):
+                log.debug("image %s was pulled concurrently", image)
+                return False
+            start = time.time()
+            pull()
+            self.store(image, time.time() - start)
+        return True
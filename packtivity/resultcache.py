@@ -0,0 +1,130 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+from .statecontexts.statehash import (
+    CONTENT_PATTERNS,
+    INDEX_NAME,
+    FileHashIndex,
+    incremental_dirhash,
+)
+
+log = logging.getLogger(__name__)
+
+
+def content_hash(directory, index):
+    """
+    SHA-1 hash of a directory's contents without the meta directories or None
+    if it is missing or empty. File digests are taken from the index.
+    """
+    if not os.path.isdir(directory):
+        return None
+    try:
+        return incremental_dirhash(directory, index, match=CONTENT_PATTERNS)
+    except ValueError:
+        return None
+
+
+class ResultCache(object):
+    """
+    On-disk, content-addressed cache of step results. Entries are keyed by the
+    spec, the finalized parameters and the contents of the readonly directories
+    and record the published data together with a hash of the readwrite
+    directories' contents after the step ran. An entry is only used if the
+    readwrite outputs are still present and unchanged. Least recently used
+    entries are evicted beyond max_entries.
+    """
+
+    def __init__(self, location, max_entries=1000):
+        self.location = location
+        self.max_entries = max_entries
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        # file digests of all steps' directories, shared across workdirs
+        self.index = FileHashIndex(os.path.join(location, INDEX_NAME))
+
+    def content_hashes(self, directories):
+        hashes = [content_hash(d, self.index) for d in directories]
+        self.index.save(prune=False)
+        return hashes
+
+    def key(self, spec, parameters, state):
+        """
+        returns the cache key of a step or None if the step is not cacheable
+        """
+        from .statecontexts.posixfs_context import LocalFSState
+
+        if not isinstance(state, LocalFSState) or not state.readwrite:
+            return None
+        keydata = {
+            "spec": spec,
+            "parameters": parameters.json(),
+            "readwrite": state.readwrite,
+            "readonly": list(zip(state.readonly, self.content_hashes(state.readonly))),
+        }
+        return hashlib.sha1(
+            json.dumps(keydata, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+
+    def outputs_hash(self, state):
+        return self.content_hashes(state.readwrite)
+
+    def entry_path(self, key):
+        return os.path.join(self.location, key[:2], "{}.json".format(key))
+
+    def lookup(self, key, state):
+        """
+        returns the cached published data (as JSON) or None on a miss
+        """
+        path = self.entry_path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (IOError, OSError, ValueError):
+            entry = None
+
+        if entry is None or entry["outputs"] != self.outputs_hash(state):
+            self.stats["misses"] += 1
+            log.debug("result cache miss %s", key)
+            return None
+
+        os.utime(path, None)
+        self.stats["hits"] += 1
+        log.debug("result cache hit %s", key)
+        return entry["pubdata"]
+
+    def store(self, key, pubdata, state):
+        path = self.entry_path(key)
+        entrydir = os.path.dirname(path)
+        if not os.path.exists(entrydir):
+            os.makedirs(entrydir)
+        entry = {"pubdata": pubdata.json(), "outputs": self.outputs_hash(state)}
+        fd, tmpname = tempfile.mkstemp(dir=entrydir)
+        with os.fdopen(fd, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmpname, path)
+        self.stats["stores"] += 1
+        self.evict()
+
+    def entries(self):
+        for entrydir in os.listdir(self.location):
+            entrydir = os.path.join(self.location, entrydir)
+            if not os.path.isdir(entrydir):
+                continue
+            for name in os.listdir(entrydir):
+                if name.endswith(".json"):
+                    yield os.path.join(entrydir, name)
+
+    def evict(self):
+        entries = list(self.entries())
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=os.path.getmtime)
+        for path in entries[: len(entries) - self.max_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self.stats["evictions"] += 1
+            log.debug("evicted result cache entry %s", path)
@@ -8,6 +8,7 @@ import six
 from dirhash import dirhash
 
 import packtivity.utils as utils
+from .statehash import FileHashIndex, incremental_dirhash, INDEX_NAME, MATCH_PATTERNS
 
 log = logging.getLogger(__name__)
 
@@ -110,19 +111,42 @@ class LocalFSState(object):
             utils.mkdir_p(d)
         utils.mkdir_p(self.metadir)
 
-    def state_hash(self):
+    def hash_index(self):
+        """
+        the index of file digests kept in the meta directory (if it exists)
+        """
+        indexpath = None
+        if self.metadir and os.path.isdir(self.metadir):
+            indexpath = os.path.join(self.metadir, INDEX_NAME)
+        return FileHashIndex(indexpath)
+
+    def state_hash(self, incremental=False, jobs=1):
         """
         generate hash to snapshot current state (used for caching / change detection)
         checks both readwrite directories and dependencies (assumed to be subtrees of readwrite directories)
+        incremental: keep file digests in an index in the meta directory and only
+        re-hash files whose size, mtime or inode changed. jobs: hashing threads
         return: SHA1 hash
         """
+        if incremental:
+            index = self.hash_index()
+
+            def hasher(d):
+                return incremental_dirhash(d, index, jobs)
+
+        else:
+
+            def hasher(d):
+                return dirhash(d, "sha1", match=MATCH_PATTERNS, jobs=jobs)
+
         # hash the upstream / input state
-        dep_checksums = [dirhash(d, "sha1") for d in self.readonly if os.path.isdir(d)]
+        dep_checksums = [hasher(d) for d in self.readonly if os.path.isdir(d)]
 
         # hash out writing state
-        state_checksums = [
-            dirhash(d, "sha1") for d in self.readwrite if os.path.isdir(d)
-        ]
+        state_checksums = [hasher(d) for d in self.readwrite if os.path.isdir(d)]
+
+        if incremental:
+            index.save()
         return hashlib.sha1(
             json.dumps([dep_checksums, state_checksums]).encode("utf-8")
         ).hexdigest()
@@ -141,8 +165,7 @@ class LocalFSState(object):
 
     def model(self, data):
         data = data.copy()
-        for p, v in data.leafs():
-            data.replace(p, self.contextualize_value(v))
+        data.replace_many([(p, self.contextualize_value(v)) for p, v in data.leafs()])
         return data
 
     def json(self):
@@ -0,0 +1,135 @@
+import concurrent.futures
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+
+from dirhash import Filter, Protocol
+from scantree import scantree
+
+log = logging.getLogger(__name__)
+
+INDEX_NAME = "state_hash_index.json"
+# never hash the index files kept in the meta directories
+MATCH_PATTERNS = ["*", "!**/_packtivity/{}".format(INDEX_NAME)]
+# the step contents only, without the logs and bookkeeping of the meta directories
+CONTENT_PATTERNS = ["*", "!**/_packtivity/"]
+
+
+def file_digest(path, chunk_size=2**20):
+    hasher = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class FileHashIndex(object):
+    """
+    Persistent index mapping file paths to their (size, mtime_ns, inode) and
+    content digest. Only files whose stat signature changed are re-hashed.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = {}
+        self.seen = set()
+        self.lock = threading.Lock()
+        if path and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self.entries = json.load(f)
+            except ValueError:
+                log.warning("ignoring corrupt state hash index %s", path)
+
+    @staticmethod
+    def signature(path):
+        st = os.stat(path)
+        return [st.st_size, st.st_mtime_ns, st.st_ino]
+
+    def stale(self, path):
+        entry = self.entries.get(path)
+        return entry is None or entry[:3] != self.signature(path)
+
+    def update(self, paths, jobs=1):
+        """
+        (re-)hashes all stale files among paths, using jobs threads
+        """
+        stale = [p for p in set(paths) if self.stale(p)]
+        log.debug("rehashing %s of %s files", len(stale), len(paths))
+
+        def rehash(path):
+            signature = self.signature(path)
+            entry = signature + [file_digest(path)]
+            with self.lock:
+                self.entries[path] = entry
+
+        if jobs > 1 and len(stale) > 1:
+            with concurrent.futures.ThreadPoolExecutor(jobs) as pool:
+                list(pool.map(rehash, stale))
+        else:
+            for path in stale:
+                rehash(path)
+        self.seen.update(paths)
+
+    def digest(self, path):
+        return self.entries[path][3]
+
+    def save(self, prune=True):
+        """
+        writes the index. prune: drop the entries for files not seen since
+        loading. Otherwise the entries are merged into the index on disk (which
+        may have been updated by other processes) and only the entries for files
+        that no longer exist are dropped.
+        """
+        if not self.path:
+            return
+        with self.lock:
+            current = dict(self.entries)
+        if prune:
+            entries = {k: v for k, v in current.items() if k in self.seen}
+        else:
+            entries = FileHashIndex(self.path).entries
+            entries.update(current)
+            entries = {k: v for k, v in entries.items() if os.path.exists(k)}
+        if not os.path.isdir(os.path.dirname(self.path)):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd, tmpname = tempfile.mkstemp(dir=os.path.dirname(self.path))
+        with os.fdopen(fd, "w") as f:
+            json.dump(entries, f)
+        os.replace(tmpname, self.path)
+
+
+def incremental_dirhash(directory, index, jobs=1, match=MATCH_PATTERNS):
+    """
+    SHA-1 directory hash identical to dirhash(directory, "sha1", match=match)
+    but file digests are taken from (and recorded in) the index.
+    """
+    filter_ = Filter(match_patterns=match)
+    protocol = Protocol()
+
+    def dir_apply(dir_node):
+        if dir_node.path.relative == "" and dir_node.empty:
+            raise ValueError("{}: Nothing to hash".format(directory))
+        descriptor = protocol.get_descriptor(dir_node)
+        return dir_node.path, hashlib.sha1(descriptor.encode("utf-8")).hexdigest()
+
+    root_node = scantree(
+        directory,
+        recursion_filter=filter_,
+        file_apply=lambda path: path,
+        follow_links=True,
+        allow_cyclic_links=protocol.allow_cyclic_links,
+        cache_file_apply=False,
+        include_empty=filter_.empty_dirs,
+        jobs=1,
+    )
+    index.update([path.real for path in root_node.filepaths()], jobs)
+
+    _, digest = root_node.apply(
+        file_apply=lambda path: (path, index.digest(path.real)),
+        dir_apply=dir_apply,
+    )
+    return digest
@@ -3,6 +3,7 @@ import os
 
 import packtivity.logutils as logutils
 from . import datamodel as _datamodel
+from .resultcache import ResultCache
 
 
 class packconfig(object):
@@ -32,6 +33,44 @@ class container_config(object):
             return False
         return self.config.get("pull_images", True)
 
+    def pull_cache_location(self):
+        return os.environ.get(
+            "PACKTIVITY_PULL_CACHE_DIR", self.config.get("pull_cache")
+        )
+
+    def pull_cache_ttl(self):
+        return float(
+            os.environ.get(
+                "PACKTIVITY_PULL_CACHE_TTL", self.config.get("pull_cache_ttl", 3600)
+            )
+        )
+
+    def warm_containers(self):
+        if "PACKTIVITY_DOCKER_WARM_CONTAINERS" in os.environ:
+            return yaml.safe_load(os.environ["PACKTIVITY_DOCKER_WARM_CONTAINERS"])
+        return self.config.get("warm_containers", False)
+
+    def warm_idle_timeout(self):
+        return float(
+            os.environ.get(
+                "PACKTIVITY_DOCKER_WARM_IDLE_TIMEOUT",
+                self.config.get("warm_idle_timeout", 300),
+            )
+        )
+
+    def warm_max_reuses(self):
+        return int(
+            os.environ.get(
+                "PACKTIVITY_DOCKER_WARM_MAX_REUSES",
+                self.config.get("warm_max_reuses", 20),
+            )
+        )
+
+    def docker_socket(self):
+        return os.environ.get(
+            "PACKTIVITY_DOCKER_SOCKET", self.config.get("docker_socket")
+        )
+
     def container_runtime(self):
         return os.environ.get("PACKTIVITY_CONTAINER_RUNTIME", "docker")
 
@@ -69,6 +108,7 @@ class ExecutionConfig(object):
     def __init__(self, config=None):
         self.config = config or {}
         self.container_config = container_config(self.config.get("containers"))
+        self._result_cache = None
 
     def disable_logging(self):
         if "PACKTIVITY_LOGGING_DISABLE" in os.environ:
@@ -88,6 +128,23 @@ class ExecutionConfig(object):
             return os.environ["PACKTIVITY_DRYRUN"]
         return self.config.get("dry_run", False)
 
+    def result_cache(self):
+        """
+        the step result cache or None if caching is disabled
+        """
+        location = os.environ.get(
+            "PACKTIVITY_RESULT_CACHE_DIR", self.config.get("result_cache")
+        )
+        if not location or self.dry_run():
+            return None
+        if self._result_cache is None or self._result_cache.location != location:
+            max_entries = os.environ.get(
+                "PACKTIVITY_RESULT_CACHE_SIZE",
+                self.config.get("result_cache_size", 1000),
+            )
+            self._result_cache = ResultCache(location, int(max_entries))
+        return self._result_cache
+
 
 def build_job(process, parameters, state, pack_config):
     """
@@ -187,6 +244,16 @@ def run_packtivity(spec, parameters, state, metadata, pack_config, exec_config):
         parameters, state = finalize_inputs(parameters, state)
         job, env = acquire_job_env(spec, parameters, state, metadata, pack_config)
 
+        cache = exec_config.result_cache() if job and env else None
+        cachekey = cache.key(spec, parameters, state) if cache else None
+        if cachekey:
+            cached = cache.lookup(cachekey, state)
+            if cached is not None:
+                log.info("using cached result %s", cachekey)
+                pubdata = _datamodel.create(cached, state.datamodel)
+                log.info("publishing data: %s", pubdata)
+                return pubdata
+
         if job and env:
             try:
                 run_in_env(job, env, state, metadata, pack_config, exec_config)
@@ -198,6 +265,11 @@ def run_packtivity(spec, parameters, state, metadata, pack_config, exec_config):
 
         pubdata = publish(spec["publisher"], parameters, state, pack_config)
         pubdata = finalize_outputs(pubdata)
+        if cachekey:
+            try:
+                cache.store(cachekey, pubdata, state)
+            except Exception:
+                log.exception("could not store result %s in the cache", cachekey)
         log.info("publishing data: %s", pubdata)
         return pubdata
 
@@ -1,16 +1,63 @@
 import json
-import jq
 import jsonpointer
-import jsonpath_rw
 import copy
 import base64
 import importlib
+import functools
+import os
 from six import string_types
 import logging
 
+import packtivity.utils as utils
+from . import jsoncodec
+
 log = logging.getLogger(__name__)
 
 
+@functools.lru_cache(maxsize=int(os.environ.get("PACKTIVITY_LEAF_CACHE_SIZE", 1024)))
+def decode_b64json(payload):
+    """
+    JSON text of a b64json:// leaf's payload, cached process-wide by the encoded
+    string. The text (not the parsed object) is cached so that every decoded
+    leaf is a fresh object, which instances may modify freely.
+    """
+    return base64.b64decode(payload).decode("utf-8")
+
+
+def _spec_object_key(obj):
+    # classes (or other objects) in a spec are identified by name and identity
+    return "{}:{}@{}".format(
+        getattr(obj, "__module__", ""),
+        getattr(obj, "__qualname__", type(obj).__name__),
+        id(obj),
+    )
+
+
+_leafmodels = {}
+
+
+def get_leafmodel(spec):
+    """
+    LeafModel for a model spec, shared between all specs of the same canonical form
+    """
+    key = json.dumps(spec, sort_keys=True, default=_spec_object_key)
+    leafmodel = _leafmodels.get(key)
+    if leafmodel is None:
+        leafmodel = _leafmodels[key] = LeafModel(spec)
+    return leafmodel
+
+
+def _resolve_jsonpointer(typed, pointer_str):
+    return utils.json_pointer(pointer_str).resolve(typed)
+
+
+def _resolve_jsonpath(typed, expression, multiple_output=False):
+    matches = utils.jsonpath_expression(expression).find(typed)
+    if not multiple_output:
+        return matches[0].value
+    return [x.value for x in matches]
+
+
 class LeafModel(object):
     def __init__(self, spec):
         self.datamodel = spec or {"keyword": None, "types": {}}
@@ -39,15 +86,14 @@ class LeafModel(object):
 
     def leaf_encode(self, obj):
         return self.canonical_leaf_magic + base64.b64encode(
-            json.dumps(self.dumper(obj)).encode("utf-8")
+            jsoncodec.dumps(self.dumper(obj)).encode("utf-8")
         ).decode("utf-8")
 
     def leaf_decode(self, encoded):
         for m in self.magics:
             if encoded.startswith(m):
                 if m == self.canonical_leaf_magic:
-                    magic_replaced = encoded.replace(self.canonical_leaf_magic, "")
-                    return json.loads(base64.b64decode(magic_replaced).decode("utf-8"))
+                    return jsoncodec.loads(decode_b64json(encoded[len(m) :]))
                 else:
                     return self.litparser(encoded)
         raise RuntimeError("cannot decode {} ".format(encoded))
@@ -71,7 +117,7 @@ class LeafModel(object):
 
     def dumper(self, obj):
         json = obj.json()
-        if not type(obj) == TypedLeafs:
+        if not isinstance(obj, TypedLeafs):
             try:
                 json[self.keyword] = self._types2str[type(obj)]
             except KeyError:
@@ -81,13 +127,28 @@ class LeafModel(object):
 
 
 class TypedLeafs(object):
-    def __init__(self, data, leafmodel=None, idleafs=False):
+    """
+    JSON data whose leafs are typed objects as per the leaf model. Copies share
+    the data, so everything handed out (__getitem__, json(), typed()) must be
+    treated as read-only. Changes go through __setitem__, __delitem__, replace
+    and replace_many, which only copy the containers along the changed path.
+    """
+
+    def __init__(self, data, leafmodel=None, idleafs=False, normalized=False):
+        """
+        normalized: trust that data is already normalized JSON (e.g. as produced
+        by .json() of another instance) and use it as-is without copying.
+        """
         self.leafmodel = leafmodel
-        self._leafmodel = LeafModel(leafmodel)
+        self._leafmodel = get_leafmodel(leafmodel)
 
         if isinstance(data, TypedLeafs):
             data = data.json()
-        self._jsonable = data
+        if normalized:
+            self.__jsonable = data
+            self._invalidate()
+        else:
+            self._jsonable = data
 
     def __repr__(self):
         return "<TypedLeafs: {}>".format(self.typed())
@@ -102,27 +163,34 @@ class TypedLeafs(object):
         return self.typed().__len__()
 
     def __delitem__(self, key):
-        self._jsonable.__delitem__(key)
+        # never mutate in place, the data might be shared with other instances
+        data = copy.copy(self._jsonable)
+        data.__delitem__(key)
+        self.__jsonable = data
+        self._invalidate()
 
     def __setitem__(self, key, value):
-        data = self._jsonable
-        data.__setitem__(key, value)
-        self._jsonable = data
+        data = copy.copy(self._jsonable)
+        data.__setitem__(key, self._normalized_value(value))
+        self.__jsonable = data
+        self._invalidate()
 
     def __normalize(self, idleafs=True):
         # wrap in a simple dict, necessary for if data is just a leaf value
-        data = {
-            "data": self._load_from_string(
-                self._dump_to_string(self._jsonable), typed=False
-            )
-        }
-        if idleafs:
+        dumped = self._dump_to_string(self._jsonable)
+        data = {"data": self._load_from_string(dumped, typed=False)}
+
+        # only scan for encoded leafs if any of the magics appear at all
+        has_magics = any(
+            jsoncodec.dumps(m)[1:-1] in dumped for m in self._leafmodel.magics
+        )
+        if idleafs and has_magics:
             magicexpr = " or ".join(
                 ['startswith("{}")'.format(m) for m in self._leafmodel.magics]
             )
             ptrs = [
                 jsonpointer.JsonPointer.from_parts(x)
-                for x in jq.jq(
+                for x in utils.jq_program(
                     'paths(type=="string" and ({}))'.format(magicexpr)
                 ).transform(data, multiple_output=True)
             ]
@@ -136,9 +204,13 @@ class TypedLeafs(object):
 
     @_jsonable.setter
     def _jsonable(self, value):
-        pass
         self.__jsonable = value
         self.__normalize()
+        self._invalidate()
+
+    def _invalidate(self):
+        # drop cached typed views, must be called on every mutation
+        self.__typed = {}
 
     @classmethod
     def fromJSON(cls, data, deserialization_opts):
@@ -146,44 +218,77 @@ class TypedLeafs(object):
             data,
             deserialization_opts.get("leafmodel", None),
             deserialization_opts.get("idleafs", False),
+            deserialization_opts.get("normalized", False),
         )
 
     def _load_from_string(self, jsonstring, typed=True, idleafs=False):
         if typed:
-            data = json.loads(
+            data = jsoncodec.loads(
                 jsonstring,
                 object_hook=lambda spec: self._leafmodel.loader(spec, idleafs),
             )
             return data
         else:
-            return json.loads(jsonstring)
+            return jsoncodec.loads(jsonstring)
 
     def _dump_to_string(self, data):
-        return json.dumps(data, default=self._leafmodel.dumper)
+        return jsoncodec.dumps(data, default=self._leafmodel.dumper)
+
+    def _normalized_value(self, value):
+        if type(value) in (str, int, float, bool) or value is None:
+            if not isinstance(value, str) or not any(
+                value.startswith(m) for m in self._leafmodel.magics
+            ):
+                return value
+        return TypedLeafs(value, self.leafmodel).json()
 
     def replace(self, path, value):
-        self._jsonable = TypedLeafs(
-            path.set(self.json(), value, inplace=False), self.leafmodel
-        ).json()
+        self.replace_many([(path, value)])
+
+    def replace_many(self, replacements):
+        """
+        applies a number of (JsonPointer, value) replacements at once. Only the
+        containers along the replaced paths are copied, the rest of the data
+        stays shared (it is never modified in place).
+        """
+        data, owned = self._jsonable, {}
+        for path, value in replacements:
+            data = utils.cow_set(data, path, self._normalized_value(value), owned)
+        self.__jsonable = data
+        self._invalidate()
 
     ### representation methods
     def json(self):
         return self._jsonable
 
     def typed(self, idleafs=False):
-        return self._load_from_string(
-            json.dumps(self._jsonable, sort_keys=True), typed=True, idleafs=idleafs
-        )
+        """
+        typed view of the data. The view is materialized lazily and cached
+        until the next mutation, callers must not modify it in place.
+        """
+        if idleafs not in self.__typed:
+            self.__typed[idleafs] = self._load_from_string(
+                jsoncodec.dumps(self._jsonable, sort_keys=True),
+                typed=True,
+                idleafs=idleafs,
+            )
+        return self.__typed[idleafs]
 
     def copy(self):
-        return TypedLeafs(copy.deepcopy(self.typed()), self.leafmodel)
+        """
+        copy sharing the data with this instance, which is not modified in
+        place: mutations replace the changed paths. Each copy builds its own
+        typed view when it is first needed.
+        """
+        return TypedLeafs(self._jsonable, self.leafmodel, normalized=True)
 
     def asrefs(self, callback=None):
-        data = self.copy().json()
+        # the data is shared, the references are set copy-on-write
+        data, owned = self.json(), {}
         for p, v in self.leafs():
             if p.path == "":
                 return p if not callback else callback(p)
-            p.set(data, p if not callback else callback(p))
+            data = utils.cow_set(data, p, p if not callback else callback(p), owned)
         return data
 
     ### QUERY methods
@@ -191,31 +296,36 @@ class TypedLeafs(object):
         return reference.get(self.typed())
 
     def jsonpointer(self, pointer_str):
-        return jsonpointer.JsonPointer(pointer_str).resolve(self.typed())
+        return _resolve_jsonpointer(self.typed(), pointer_str)
 
     def jsonpath(self, jsonpath_expression, multiple_output=False):
-        if not multiple_output:
-            return jsonpath_rw.parse(jsonpath_expression).find(self.typed())[0].value
-        else:
-            return [
-                x.value
-                for x in jsonpath_rw.parse(jsonpath_expression).find(self.typed())
-            ]
+        return _resolve_jsonpath(self.typed(), jsonpath_expression, multiple_output)
+
+    def query_many(self, queries, multiple_output=False):
+        """
+        evaluates a number of ("jsonpointer" or "jsonpath", expression) queries
+        against a single typed view. returns the results in order.
+        """
+        typed = self.typed()
+        results = []
+        for kind, expression in queries:
+            if kind == "jsonpointer":
+                results.append(_resolve_jsonpointer(typed, expression))
+            elif kind == "jsonpath":
+                results.append(_resolve_jsonpath(typed, expression, multiple_output))
+            else:
+                raise ValueError("unknown query type {}".format(kind))
+        return results
 
     def jq(self, jq_program, *args, **kwargs):
         return TypedLeafs(
-            jq.jq(jq_program).transform(self.typed(idleafs=True), *args, **kwargs),
+            utils.jq_program(jq_program).transform(
+                self.typed(idleafs=True), *args, **kwargs
+            ),
             self.leafmodel,
             idleafs=True,
         )
 
     def leafs(self):
-        if not isinstance(self.typed(), (list, dict)):
-            yield jsonpointer.JsonPointer(""), self.typed()
-        else:
-            ptrs = [
-                jsonpointer.JsonPointer.from_parts(parts)
-                for parts in self.jq("paths(scalars)", multiple_output=True).typed()
-            ]
-            for p in ptrs:
-                yield p, p.get(self.typed())
+        for p, v in utils.leaf_iterator(self.typed()):
+            yield p, v
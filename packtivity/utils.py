@@ -1,8 +1,18 @@
 import os
+import collections
+import copy
 import errno
+import functools
+import hashlib
+import json
+import random
+import tempfile
+import time
 import jq
 import jsonpointer
+import jsonpath_rw
 import yadageschemas
+import yaml
 
 
 def handler_decorator():
@@ -28,19 +38,288 @@ def mkdir_p(path):
             raise
 
 
+@functools.lru_cache(maxsize=int(os.environ.get("PACKTIVITY_JQ_CACHE_SIZE", 256)))
+def jq_program(program):
+    """
+    compiled jq program, cached process-wide by program text
+    hit/miss statistics are available via jq_program.cache_info()
+    """
+    return jq.jq(program)
+
+
+@functools.lru_cache(maxsize=int(os.environ.get("PACKTIVITY_JSONPATH_CACHE_SIZE", 256)))
+def jsonpath_expression(expression):
+    """
+    parsed JSONPath expression, cached process-wide by expression text
+    """
+    return jsonpath_rw.parse(expression)
+
+
+@functools.lru_cache(
+    maxsize=int(os.environ.get("PACKTIVITY_JSONPOINTER_CACHE_SIZE", 1024))
+)
+def json_pointer(pointer_str):
+    """
+    JsonPointer for a pointer string, cached process-wide. Must not be modified.
+    """
+    return jsonpointer.JsonPointer(pointer_str)
+
+
 def leaf_iterator(jsonable):
+    """
+    iterates over all leaf values of a nested list/dict structure in a single pass
+    yields (JsonPointer, value) tuples. Just as jq's paths(scalars) null and false
+    leaves are skipped, a non-container document is its own (root) leaf.
+    """
     if not isinstance(jsonable, (list, dict)):
         yield jsonpointer.JsonPointer(""), jsonable
+        return
+
+    stack = [((), jsonable)]
+    while stack:
+        parts, node = stack.pop()
+        if isinstance(node, dict):
+            children = list(node.items())
+        elif isinstance(node, list):
+            children = list(enumerate(node))
+        else:
+            if node is None or node is False:
+                continue
+            yield jsonpointer.JsonPointer.from_parts(parts), node
+            continue
+        # push in reverse so that leaves come out in document order
+        for key, value in reversed(children):
+            stack.append((parts + (key,), value))
+
+
+def owned_copy(container, owned):
+    """
+    returns container itself if it is owned (i.e. in the dict owned, mapping
+    ids to containers that may be modified in place) or an owned shallow copy
+    """
+    if id(container) in owned:
+        return container
+    container = copy.copy(container)
+    owned[id(container)] = container
+    return container
+
+
+def cow_set(data, pointer, value, owned):
+    """
+    copy-on-write version of pointer.set(data, value): only the containers
+    along the path that are not owned yet are copied, everything else stays
+    shared with the original data. returns the new root.
+    """
+    if not pointer.parts:
+        return value
+    root = container = owned_copy(data, owned)
+    for part in pointer.parts[:-1]:
+        key = pointer.get_part(container, part)
+        child = container[key] = owned_copy(container[key], owned)
+        container = child
+    key = pointer.get_part(container, pointer.parts[-1])
+    if isinstance(container, list) and key in ("-", len(container)):
+        container.append(value)
+    else:
+        container[key] = value
+    return root
+
+
+def backoff_periods(initial=0.01, maximum=5.0, factor=2.0, jitter=0.1):
+    """
+    generates exponentially growing wait periods (in seconds) capped at maximum,
+    each randomized by a relative jitter to avoid synchronized polling.
+    """
+    period = initial
+    while True:
+        yield period * random.uniform(1 - jitter, 1 + jitter)
+        period = min(period * factor, maximum)
+
+
+def wait_until_ready(backend, proxy, timeout, periods=None):
+    """
+    blocks until a proxy is ready or timeout seconds passed, returns readiness.
+    uses the backend's native wait(proxy, timeout) hook if there is one and
+    polls ready() otherwise, sleeping for the given periods (any iterable, the
+    last period is repeated once it is exhausted) in between.
+    """
+    deadline = time.time() + timeout
+    periods = iter(periods) if periods is not None else backoff_periods()
+    # polled at the default initial rate if no periods are given at all
+    period = 0.01
+    waithook = getattr(backend, "wait", None)
+    while True:
+        if waithook:
+            ready = waithook(proxy, max(deadline - time.time(), 0))
+        else:
+            ready = backend.ready(proxy)
+        if ready:
+            return True
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return False
+        period = next(periods, period)
+        time.sleep(min(period, remaining))
+
+
+def ready_many(backend, proxies):
+    """
+    readiness of a number of proxies, using the backend's batched ready_many
+    check if it offers one.
+    """
+    if hasattr(backend, "ready_many"):
+        return backend.ready_many(proxies)
+    return [backend.ready(p) for p in proxies]
+
+
+# resolved specs by cache key, the least recently used are dropped
+_spec_cache = collections.OrderedDict()
+SPEC_CACHE_SIZE = 256
+
+
+def file_sha1(path):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def schema_fingerprint(schemasource):
+    """
+    hash of the contents of a local schema directory, the location otherwise
+    """
+    if not os.path.isdir(schemasource):
+        return str(schemasource)
+    hasher = hashlib.sha1()
+    for root, dirs, files in os.walk(schemasource):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            hasher.update(os.path.relpath(path, schemasource).encode("utf-8"))
+            hasher.update(file_sha1(path).encode("utf-8"))
+    return hasher.hexdigest()
+
+
+def spec_files(specfile):
+    """
+    the local files a spec file consists of, i.e. the file itself and all
+    files it (transitively) pulls in via JSON references. Returns None if any
+    of the references is not a local file.
+    """
+    files, pending = [], [os.path.abspath(specfile)]
+    while pending:
+        path = pending.pop()
+        if path in files:
+            continue
+        files.append(path)
+        with open(path) as f:
+            data = yaml.safe_load(f)
+        for pointer, ref in leaf_iterator(data):
+            if not pointer.parts or pointer.parts[-1] != "$ref":
+                continue
+            target = str(ref).split("#")[0]
+            if not target:
+                continue
+            if ":" in target.split("/")[0]:
+                return None
+            pending.append(os.path.join(os.path.dirname(path), target))
+    return files
+
+
+def spec_cache_key(spec, toplevel, schemasource, validate):
+    """
+    cache key for a packtivity spec. For specs that are local files the key
+    includes the file content so that changes invalidate the cache, documents
+    pulled in via JSON references are checked on lookup (see _cached_spec).
+    """
+    keydata = [
+        spec,
+        str(toplevel),
+        str(schemasource),
+        schema_fingerprint(schemasource),
+        validate,
+    ]
+    specfile = os.path.join(toplevel, spec.split("#")[0])
+    if os.path.isfile(specfile):
+        keydata.append(file_sha1(specfile))
+    elif not os.path.isdir(toplevel):
+        # remote specs can only be cached in memory for the process lifetime
+        keydata.append("remote")
     else:
-        allleafs = jq.jq("paths(scalars)").transform(jsonable, multiple_output=True)
-        leafpointers = [jsonpointer.JsonPointer.from_parts(x) for x in allleafs]
-        for x in leafpointers:
-            yield x, x.get(jsonable)
+        return None
+    return hashlib.sha1(json.dumps(keydata).encode("utf-8")).hexdigest()
+
+
+def spec_cache_dir():
+    return os.environ.get("PACKTIVITY_SPEC_CACHE_DIR")
+
+
+def _fresh(entry):
+    # the files a spec was resolved from must not have changed since
+    try:
+        return all(file_sha1(p) == digest for p, digest in entry["files"].items())
+    except (IOError, OSError):
+        return False
+
+
+def _cached_spec(key):
+    """
+    the cached spec (as JSON) for a key or None if it is unknown or outdated
+    """
+    entry = _spec_cache.get(key)
+    if entry is None:
+        cachedir = spec_cache_dir()
+        cachefile = os.path.join(cachedir or "", "{}.json".format(key))
+        if not cachedir or not os.path.exists(cachefile):
+            return None
+        with open(cachefile) as f:
+            entry = json.load(f)
+    if not _fresh(entry):
+        _spec_cache.pop(key, None)
+        return None
+    _spec_cache[key] = entry
+    _spec_cache.move_to_end(key)
+    while len(_spec_cache) > SPEC_CACHE_SIZE:
+        _spec_cache.popitem(last=False)
+    return entry["spec"]
+
+
+def _store_spec(key, spec, specfile):
+    files = spec_files(specfile) if specfile else None
+    entry = {
+        "spec": json.dumps(spec),
+        "files": {p: file_sha1(p) for p in files or []},
+    }
+    _spec_cache[key] = entry
+    while len(_spec_cache) > SPEC_CACHE_SIZE:
+        _spec_cache.popitem(last=False)
+    cachedir = spec_cache_dir()
+    # specs with remote parts can only be cached in memory
+    if cachedir and files:
+        mkdir_p(cachedir)
+        fd, tmpname = tempfile.mkstemp(dir=cachedir)
+        with os.fdopen(fd, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmpname, os.path.join(cachedir, "{}.json".format(key)))
 
 
 def load_packtivity(
-    spec, toplevel=os.getcwd(), schemasource=yadageschemas.schemadir, validate=True
+    spec,
+    toplevel=os.getcwd(),
+    schemasource=yadageschemas.schemadir,
+    validate=True,
+    cache=True,
 ):
+    """
+    loads (and validates) a packtivity spec. Resolved specs are cached in memory
+    and additionally on disk if PACKTIVITY_SPEC_CACHE_DIR is set.
+    """
+    key = None
+    if cache:
+        key = spec_cache_key(spec, toplevel, schemasource, validate)
+        cached = _cached_spec(key) if key else None
+        if cached is not None:
+            return json.loads(cached)
+
     # in case that spec is a json reference string, we will treat it as such
     # if it's just a filename, this should not affect it...
     spec, specopts = (
@@ -58,5 +337,8 @@ def load_packtivity(
         "schema_name": "packtivity/packtivity-schema",
     }
 
-    spec = yadageschemas.load(spec, specopts, validate=validate, validopts=validopts)
-    return spec
+    loaded = yadageschemas.load(spec, specopts, validate=validate, validopts=validopts)
+    if key:
+        specfile = os.path.join(toplevel, spec.split("#")[0])
+        _store_spec(key, loaded, specfile if os.path.isfile(specfile) else None)
+    return loaded
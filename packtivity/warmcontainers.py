@@ -0,0 +1,182 @@
+import logging
+import math
+import os
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# label of all warm containers, the value is the id of the owning process
+LABEL = "packtivity.warm_container"
+LEASE_FILE = "/tmp/.packtivity_lease"
+JOBS_FILE = "/tmp/.packtivity_jobs"
+
+
+# extra lifetime of idle containers beyond the pool's idle timeout
+KEEPALIVE_MARGIN = 30
+
+
+def keepalive_command(idle_timeout, lease=LEASE_FILE, jobs=JOBS_FILE):
+    """
+    main process of a warm container. It exits (and the container with it) once
+    no job was started or finished and no job was running for idle_timeout
+    seconds, so that containers orphaned by a killed process do not stay around.
+    Fractions of seconds are rounded up, busybox sleep only takes integers.
+    """
+    return [
+        "sh",
+        "-c",
+        (
+            "touch {lease}; "
+            "while sleep {timeout}; do "
+            "if [ -e {lease} ]; then rm -f {lease}; continue; fi; "
+            "for pid in $(cat {jobs} 2>/dev/null); do "
+            "kill -0 $pid 2>/dev/null && continue 2; "
+            "done; "
+            "exit 0; "
+            "done"
+        ).format(lease=lease, jobs=jobs, timeout=max(math.ceil(idle_timeout), 1)),
+    ]
+
+
+def leased_command(argv, lease=LEASE_FILE, jobs=JOBS_FILE):
+    """
+    wraps a job's command line to renew the lease of the container it runs in
+    """
+    return [
+        "sh",
+        "-c",
+        (
+            'echo $$ >> {jobs}; touch {lease}; "$@"; '
+            "status=$?; touch {lease}; exit $status"
+        ).format(lease=lease, jobs=jobs),
+        "sh",
+    ] + list(argv)
+
+
+class WarmContainer(object):
+    def __init__(self, cid, signature, sources):
+        self.cid = cid
+        self.signature = signature
+        self.sources = sources
+        self.uses = 0
+        self.busy = False
+        self.last_used = time.time()
+
+
+def source_ids(sources):
+    """
+    identities of the bind mount sources. A container keeps seeing the old
+    directory if a source is removed and re-created, so they must not change.
+    """
+    ids = []
+    for source in sources:
+        try:
+            st = os.stat(source)
+        except OSError:
+            return None
+        ids.append((st.st_dev, st.st_ino))
+    return ids
+
+
+class WarmContainerPool(object):
+    """
+    Keeps idle containers around per (image, mounts) signature so that
+    successive steps with the same signature can be executed in them instead of
+    starting a fresh container. Containers are removed once they were used
+    max_reuses times, were idle for more than idle_timeout seconds or when one
+    of their bind mount sources changed. The containers themselves are expected
+    to exit some time after being idle for idle_timeout (see keepalive_command),
+    alive(cid) tells whether a container is still running.
+    """
+
+    def __init__(self, remove, idle_timeout=300, max_reuses=20, alive=None):
+        self.remove = remove
+        self.alive = alive
+        self.idle_timeout = idle_timeout
+        self.max_reuses = max_reuses
+        self.containers = []
+        self.lock = threading.Lock()
+
+    def acquire(self, signature, sources, start):
+        """
+        returns an idle container matching the signature, calling start() to
+        launch one (it returns the container id) if there is none. Containers
+        that are no longer running (see alive) are dropped.
+        """
+        self.evict_idle()
+        ids = source_ids(sources)
+        while True:
+            container = self.checkout(signature, ids)
+            if container is None or self.alive is None or self.alive(container.cid):
+                break
+            log.debug("warm container %s is not running anymore", container.cid)
+            with self.lock:
+                self.containers.remove(container)
+            self.discard(container)
+
+        if container is None:
+            container = WarmContainer(start(), signature, ids)
+            container.busy = True
+            log.debug("started warm container %s", container.cid)
+            with self.lock:
+                self.containers.append(container)
+        return container
+
+    def checkout(self, signature, ids):
+        # marks an idle container as busy, dropping those with changed sources
+        stale = []
+        with self.lock:
+            for container in self.containers:
+                if container.busy or container.signature != signature:
+                    continue
+                if container.sources != ids:
+                    stale.append(container)
+                    continue
+                container.busy = True
+                break
+            else:
+                container = None
+            for c in stale:
+                self.containers.remove(c)
+        for c in stale:
+            log.debug("mount sources of container %s changed", c.cid)
+            self.discard(c)
+        return container
+
+    def release(self, container, reusable=True):
+        with self.lock:
+            container.uses += 1
+            container.last_used = time.time()
+            if reusable and container.uses < self.max_reuses:
+                container.busy = False
+                return
+            if container in self.containers:
+                self.containers.remove(container)
+        self.discard(container)
+
+    def evict_idle(self):
+        now = time.time()
+        with self.lock:
+            idle = [
+                c
+                for c in self.containers
+                if not c.busy and now - c.last_used > self.idle_timeout
+            ]
+            for c in idle:
+                self.containers.remove(c)
+        for c in idle:
+            log.debug("evicting idle container %s", c.cid)
+            self.discard(c)
+
+    def discard(self, container):
+        try:
+            self.remove(container.cid)
+        except Exception:
+            log.exception("could not remove container %s", container.cid)
+
+    def close(self):
+        with self.lock:
+            containers, self.containers = self.containers, []
+        for c in containers:
+            self.discard(c)
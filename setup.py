@@ -14,6 +14,7 @@ deps = [
     "yadage-schemas",
     "mock",
     "dirhash>=0.4.0",
+    "scantree",
 ]
 
 this_directory = Path(__file__).parent
@@ -36,7 +37,9 @@ setup(
         "celery": [
             "celery>=5.0.0",
             "redis",
-        ]
+        ],
+        "orjson": ["orjson"],
+        "persistent": ["pyrsistent"],
     },
     entry_points={
         "console_scripts": [
@@ -30,3 +30,72 @@ def test_multiproc_fail(tmpdir, basic_localfs_state, localproc_pack_fail):
         pass
     assert backend.successful(proxy) == False
     backend.fail_info(proxy)
+
+
+def test_multiproc_shared_pool():
+    first = MultiProcBackend(3)
+    second = MultiProcBackend(3)
+    assert first.pool is second.pool
+
+    with MultiProcBackend(3, shared=False) as private:
+        assert private.pool is not first.pool
+    assert private.pool is None
+
+    pool = first.pool
+    first.close()
+    assert pool.apply_async(abs, (-1,)).get() == 1
+    second.close()
+    with MultiProcBackend(3) as third:
+        assert third.pool is not pool
+
+
+def test_asyncio_backend(tmpdir):
+    import asyncio
+    import packtivity
+    from packtivity.asyncbackends import AsyncioBackend
+    from packtivity.statecontexts.posixfs_context import LocalFSState
+
+    pack = packtivity.pack_object.fromspec("tests/testspecs/noop-test.yml")
+    states = [LocalFSState([str(tmpdir.join(str(i)))]) for i in range(10)]
+    for state in states:
+        state.ensure()
+
+    async def main():
+        with AsyncioBackend(max_workers=4) as backend:
+            return await asyncio.gather(
+                *[
+                    pack.acall(
+                        {"a_parameter": i},
+                        state,
+                        asyncbackend=backend,
+                        metadata={"name": "step{}".format(i)},
+                    )
+                    for i, state in enumerate(states)
+                ]
+            )
+
+    results = asyncio.run(main())
+    assert [r.json() for r in results] == [{"output": i} for i in range(10)]
+
+
+def test_asyncio_backend_concurrency(monkeypatch):
+    import asyncio
+    import threading
+    from packtivity.asyncbackends import AsyncioBackend
+
+    # more blocking packtivities than the loop's default executor would run
+    count = 64
+    barrier = threading.Barrier(count, timeout=10)
+
+    async def main():
+        with AsyncioBackend() as backend:
+            assert backend.max_workers == 256
+            proxies = [backend.submit_callable(barrier.wait) for _ in range(count)]
+            return await asyncio.gather(*proxies)
+
+    assert sorted(asyncio.run(main())) == list(range(count))
+
+    monkeypatch.setenv("PACKTIVITY_ASYNCIO_WORKERS", "8")
+    backend = AsyncioBackend()
+    assert backend.max_workers == 8
+    backend.close()
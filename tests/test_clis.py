@@ -102,3 +102,19 @@ def test_validatecli_invalid(tmpdir):
         packtivity.cli.validatecli, ["tests/testspecs/noop-test-invalid.yml"]
     )
     assert result.exit_code == 1
+
+
+def test_prefetch_dryrun(monkeypatch):
+    monkeypatch.setenv("PACKTIVITY_DRYRUN", "1")
+    runner = CliRunner()
+    result = runner.invoke(
+        packtivity.cli.utilcli,
+        [
+            "prefetch",
+            "tests/testspecs/dockertouchfile.yml",
+            "tests/testspecs/dockertouchfile_script.yml",
+            "tests/testspecs/localtouchfile.yml",
+        ],
+    )
+    assert result.exit_code == 0
+    assert result.output.splitlines() == ["pulled busybox:latest"]
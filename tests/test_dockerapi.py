@@ -0,0 +1,259 @@
+import json
+import os
+import shutil
+import socketserver
+import struct
+import tempfile
+import threading
+import urllib.parse
+
+import pytest
+
+from packtivity.dockerapi import DockerEngineClient, DockerEngineError
+from packtivity.handlers.execution_handlers import run_containers_via_engine_api
+from packtivity.syncbackends import ExecutionConfig
+
+
+def frame(stream, data):
+    return struct.pack(">BxxxL", stream, len(data)) + data
+
+
+class StubDockerHandler(socketserver.StreamRequestHandler):
+    def respond(self, status, body=b""):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode("utf-8")
+        self.wfile.write(
+            b"HTTP/1.1 %d OK\r\nContent-Length: %d\r\nConnection: close\r\n\r\n"
+            % (status, len(body))
+            + body
+        )
+
+    def handle(self):
+        server = self.server
+        method, target, _ = self.rfile.readline().decode("utf-8").split()
+        headers = {}
+        for line in iter(self.rfile.readline, b"\r\n"):
+            key, value = line.decode("utf-8").split(":", 1)
+            headers[key.lower()] = value.strip()
+        body = self.rfile.read(int(headers.get("content-length", 0)))
+        url = urllib.parse.urlparse(target)
+        query = urllib.parse.parse_qs(url.query)
+        server.calls.append((method, url.path))
+        server.headers.append(headers)
+
+        if (method, url.path) in server.failing:
+            self.respond(500, {"message": "failing {}".format(url.path)})
+        elif url.path == "/images/create":
+            if query["fromImage"] == ["missing:latest"]:
+                self.respond(200, b'{"error": "not found"}\r\n')
+            else:
+                self.respond(200, b'{"status": "Pulling"}\r\n{"status": "Done"}\r\n')
+        elif url.path == "/containers/create":
+            server.config = json.loads(body)
+            self.respond(201, {"Id": "stubcid"})
+        elif url.path == "/containers/stubcid/attach":
+            self.wfile.write(b"HTTP/1.1 101 UPGRADED\r\nUpgrade: tcp\r\n\r\n")
+            self.wfile.flush()
+            server.started.wait(5)
+            stdin = self.rfile.read() if "stdin" in query else b""
+            self.wfile.write(frame(1, b"hello\nwor") + frame(1, b"ld\n"))
+            self.wfile.write(frame(2, b"stdin: " + stdin))
+        elif url.path == "/containers/stubcid/start":
+            server.started.set()
+            self.respond(204)
+        elif url.path == "/containers/stubcid/wait":
+            self.respond(200, {"StatusCode": server.exit_code})
+        elif method == "DELETE":
+            self.respond(204)
+        else:
+            self.respond(404, {"message": "no such endpoint"})
+
+
+@pytest.fixture()
+def stub_docker():
+    # unix socket paths are limited in length, keep it short
+    socketdir = tempfile.mkdtemp()
+    server = socketserver.ThreadingUnixStreamServer(
+        os.path.join(socketdir, "docker.sock"), StubDockerHandler
+    )
+    server.daemon_threads = True
+    server.calls = []
+    server.headers = []
+    server.failing = set()
+    server.started = threading.Event()
+    server.exit_code = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    shutil.rmtree(socketdir)
+
+
+def race_spec(stdin=None):
+    return {
+        "workdir": "/work",
+        "stdin": stdin,
+        "tty": False,
+        "argv": ["sh", "-c", "cat"],
+        "image": "busybox:latest",
+        "mounts": [
+            {"type": "bind", "source": "/a", "destination": "/b", "readonly": True}
+        ],
+        "env": [{"name": "KEY", "value": "value"}],
+    }
+
+
+def test_engine_api_run(tmpdir, basic_localfs_state, stub_docker, monkeypatch):
+    import logging
+
+    monkeypatch.setenv("PACKTIVITY_DOCKER_SOCKET", stub_docker.server_address)
+    basic_localfs_state.ensure()
+    run_containers_via_engine_api(
+        ExecutionConfig(),
+        basic_localfs_state,
+        logging.getLogger("test"),
+        {"name": "myname"},
+        race_spec(stdin="echo script"),
+    )
+    assert [c[1] for c in stub_docker.calls] == [
+        "/images/create",
+        "/containers/create",
+        "/containers/stubcid/attach",
+        "/containers/stubcid/start",
+        "/containers/stubcid/wait",
+        "/containers/stubcid",
+    ]
+    assert stub_docker.config["Cmd"] == ["sh", "-c", "cat"]
+    assert stub_docker.config["Env"] == ["KEY=value"]
+    assert stub_docker.config["HostConfig"]["Binds"] == ["/a:/b:ro"]
+    assert stub_docker.config["OpenStdin"]
+
+    runlog = tmpdir.join("_packtivity", "myname.run.log").read()
+    assert "hello" in runlog
+    assert "world" in runlog
+    assert "stdin: echo script" in runlog
+
+
+def test_engine_api_failure(basic_localfs_state, stub_docker, monkeypatch):
+    import logging
+
+    monkeypatch.setenv("PACKTIVITY_DOCKER_SOCKET", stub_docker.server_address)
+    monkeypatch.setenv("PACKTIVITY_DOCKER_NOPULL", "1")
+    basic_localfs_state.ensure()
+    stub_docker.exit_code = 3
+    with pytest.raises(RuntimeError, match="exited with code 3"):
+        run_containers_via_engine_api(
+            ExecutionConfig(),
+            basic_localfs_state,
+            logging.getLogger("test"),
+            {"name": "myname"},
+            race_spec(),
+        )
+    assert stub_docker.calls[-1] == ("DELETE", "/containers/stubcid")
+
+
+def test_engine_api_errors(stub_docker):
+    client = DockerEngineClient(stub_docker.server_address)
+    with pytest.raises(DockerEngineError, match="not found"):
+        client.pull("missing:latest")
+    with pytest.raises(DockerEngineError) as excinfo:
+        client.call("GET", "/unknown")
+    assert excinfo.value.status == 404
+
+
+def test_engine_api_failing_remove(basic_localfs_state, stub_docker, monkeypatch):
+    import logging
+
+    monkeypatch.setenv("PACKTIVITY_DOCKER_SOCKET", stub_docker.server_address)
+    monkeypatch.setenv("PACKTIVITY_DOCKER_NOPULL", "1")
+    basic_localfs_state.ensure()
+    stub_docker.failing = {
+        ("POST", "/containers/stubcid/wait"),
+        ("DELETE", "/containers/stubcid"),
+    }
+    with pytest.raises(DockerEngineError, match="failing /containers/stubcid/wait"):
+        run_containers_via_engine_api(
+            ExecutionConfig(),
+            basic_localfs_state,
+            logging.getLogger("test"),
+            {"name": "myname"},
+            race_spec(),
+        )
+    assert stub_docker.calls[-1] == ("DELETE", "/containers/stubcid")
+
+
+def test_registry_auth(tmpdir, stub_docker, monkeypatch):
+    import base64
+    from packtivity import dockerapi
+
+    config = {
+        "auths": {
+            "https://index.docker.io/v1/": {
+                "auth": base64.b64encode(b"user:secret").decode("ascii")
+            },
+            "https://registry.example.com": {"identitytoken": "token"},
+        },
+        "credHelpers": {"helped.example.com": "ecr-login"},
+    }
+    tmpdir.join("config.json").write(json.dumps(config))
+    monkeypatch.setenv("DOCKER_CONFIG", str(tmpdir))
+
+    def decoded(auth):
+        return json.loads(base64.urlsafe_b64decode(auth))
+
+    assert decoded(dockerapi.registry_auth("busybox:latest")) == {
+        "username": "user",
+        "password": "secret",
+        "serveraddress": "https://index.docker.io/v1/",
+    }
+    assert decoded(dockerapi.registry_auth("registry.example.com/a/b:1")) == {
+        "identitytoken": "token",
+        "serveraddress": "registry.example.com",
+    }
+    assert dockerapi.registry_auth("localhost:5000/image") is None
+    assert dockerapi.credential_helper("helped.example.com/image") == "ecr-login"
+    assert dockerapi.credential_helper("busybox") is None
+
+    client = DockerEngineClient(stub_docker.server_address)
+    client.pull("busybox:latest", dockerapi.registry_auth("busybox:latest"))
+    assert decoded(stub_docker.headers[-1]["x-registry-auth"])["username"] == "user"
+
+
+def test_engine_api_cli_fallbacks(monkeypatch):
+    import logging
+    from packtivity import dockerapi
+    from packtivity.handlers import execution_handlers
+
+    monkeypatch.setenv("DOCKER_HOST", "tcp://127.0.0.1:2375")
+    monkeypatch.delenv("PACKTIVITY_DOCKER_SOCKET", raising=False)
+    assert dockerapi.default_socket_path() is None
+    with pytest.raises(DockerEngineError, match="not a unix socket"):
+        DockerEngineClient()
+
+    calls = []
+    monkeypatch.setattr(
+        execution_handlers,
+        "run_containers_in_docker_runtime",
+        lambda *args: calls.append(args[-1]),
+    )
+    run_containers_via_engine_api(
+        ExecutionConfig(),
+        None,
+        logging.getLogger("test"),
+        {"name": "myname"},
+        race_spec(),
+    )
+    assert calls == [race_spec()]
+
+    # docker run flags only the CLI understands
+    monkeypatch.delenv("DOCKER_HOST")
+    monkeypatch.setenv("PACKTIVITY_DOCKER_CMD_MOD", "--gpus all")
+    run_containers_via_engine_api(
+        ExecutionConfig(),
+        None,
+        logging.getLogger("test"),
+        {"name": "myname"},
+        race_spec(),
+    )
+    assert calls == [race_spec(), race_spec()]
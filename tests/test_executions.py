@@ -4,9 +4,16 @@ from packtivity import datamodel as pdm
 from packtivity.handlers.execution_handlers import (
     command_argv,
     docker_execution_cmdline,
+    execute_and_tail_subprocess,
+    tail_subprocesses,
 )
 from packtivity.syncbackends import ExecutionConfig
 import logging
+import shlex
+import subprocess
+import time
+
+import pytest
 
 
 def test_docker_cvmfs(tmpdir, basic_localfs_state, docker_env_resources, monkeypatch):
@@ -61,3 +68,281 @@ def test_docker_auth(tmpdir, basic_localfs_state):
         },
     )
     assert "-v /home/recast/recast_auth:/recast_auth:rw" in cmdline
+
+
+def test_tail_latency():
+    log = logging.getLogger("test")
+    start = time.time()
+    execute_and_tail_subprocess(
+        ExecutionConfig(), {"name": "myname"}, None, log, "echo hello"
+    )
+    assert time.time() - start < 0.4
+
+
+def test_tail_failure():
+    log = logging.getLogger("test")
+    with pytest.raises(RuntimeError):
+        execute_and_tail_subprocess(
+            ExecutionConfig(), {"name": "myname"}, None, log, "sh -c 'exit 3'"
+        )
+
+
+def test_tail_many(caplog):
+    procs = [
+        (
+            subprocess.Popen(
+                ["sh", "-c", "echo first{0}; sleep 0.1; printf last{0}".format(i)],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+            ),
+            logging.getLogger("test.tail{}".format(i)),
+        )
+        for i in range(5)
+    ]
+    with caplog.at_level(logging.INFO):
+        assert tail_subprocesses(procs) == [0] * 5
+    for i in range(5):
+        logged = [r.msg for r in caplog.records if r.name == "test.tail{}".format(i)]
+        assert logged == [
+            "first{}".format(i).encode("utf-8"),
+            "last{}".format(i).encode("utf-8"),
+        ]
+
+
+def test_pull_cache(tmpdir, basic_localfs_state, monkeypatch):
+    import threading
+    import packtivity.handlers.execution_handlers as execution_handlers
+
+    basic_localfs_state.ensure()
+    pulls = []
+
+    def fake_pull(config, metadata, state, log, command_string, **kwargs):
+        time.sleep(0.1)
+        pulls.append(command_string)
+
+    monkeypatch.setattr(execution_handlers, "execute_and_tail_subprocess", fake_pull)
+    monkeypatch.setenv("PACKTIVITY_PULL_CACHE_DIR", str(tmpdir.join("pulls")))
+    config = ExecutionConfig()
+    log = logging.getLogger("test")
+
+    def pull(image):
+        execution_handlers.pull_image(
+            config, basic_localfs_state, log, {"name": "step"}, image
+        )
+
+    threads = [threading.Thread(target=pull, args=("busybox:1.0",)) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert pulls == ["docker pull busybox:1.0"]
+    assert "pulled image busybox:1.0" in tmpdir.join("_packtivity/step.pull.log").read()
+
+    monkeypatch.setenv("PACKTIVITY_PULL_CACHE_TTL", "0")
+    pull("busybox:1.0")
+    pull("busybox@sha256:abc")
+    pull("busybox@sha256:abc")
+    assert pulls[1:] == ["docker pull busybox:1.0", "docker pull busybox@sha256:abc"]
+
+
+def test_prefetch_images(monkeypatch, caplog):
+    import threading
+    import packtivity.handlers.execution_handlers as execution_handlers
+
+    lock = threading.Lock()
+    active, peak = [0], [0]
+
+    def fake_pull(config, state, log, metadata, image):
+        assert metadata["name"] == "prefetch.{}".format(image)
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.05)
+        with lock:
+            active[0] -= 1
+        if image.startswith("missing"):
+            raise RuntimeError("pull failed")
+
+    monkeypatch.setattr(execution_handlers, "pull_image", fake_pull)
+    images = ["image{}:latest".format(i) for i in range(6)] + ["missing:latest"]
+    with caplog.at_level(logging.ERROR):
+        failed = execution_handlers.prefetch_images(
+            ExecutionConfig(), images, parallel=2
+        )
+    assert failed == ["missing:latest"]
+    assert peak[0] == 2
+    assert caplog.records[-1].exc_info[1].args == ("pull failed",)
+
+    specs = [
+        {"environment": {"environment_type": "docker-encapsulated", "image": "a"}},
+        {
+            "environment": {
+                "environment_type": "docker-encapsulated",
+                "image": "a",
+                "imagetag": "latest",
+            }
+        },
+        {"environment": {"environment_type": "localproc-env"}},
+    ]
+    assert execution_handlers.spec_images(specs) == ["a:latest"]
+
+
+def test_warm_container_pool(tmpdir):
+    from packtivity.warmcontainers import WarmContainerPool
+
+    removed, started = [], []
+
+    def start():
+        started.append("c{}".format(len(started)))
+        return started[-1]
+
+    pool = WarmContainerPool(removed.append, idle_timeout=60, max_reuses=2)
+    source = tmpdir.mkdir("work")
+
+    first = pool.acquire("sig", [str(source)], start)
+    # busy containers are not shared
+    assert pool.acquire("sig", [str(source)], start).cid == "c1"
+    pool.release(first)
+    assert pool.acquire("sig", [str(source)], start) is first
+    pool.release(first)
+    assert removed == ["c0"]
+
+    # a failed job's container is not reused
+    other = pool.acquire("other", [str(source)], start)
+    pool.release(other, reusable=False)
+    assert removed == ["c0", "c2"]
+
+    # re-created mount sources invalidate the container
+    recreated = pool.acquire("sig", [str(source)], start)
+    pool.release(recreated)
+    # the container's mount keeps the old directory (and its inode) alive
+    source.rename(tmpdir.join("old"))
+    tmpdir.mkdir("work")
+    assert pool.acquire("sig", [str(source)], start).cid == "c4"
+    assert removed[-1] == "c3"
+
+    pool.idle_timeout = -1
+    pool.evict_idle()
+    pool.close()
+    assert sorted(removed) == ["c0", "c1", "c2", "c3", "c4"]
+
+
+def test_warm_container_pool_liveness(tmpdir):
+    from packtivity.warmcontainers import WarmContainerPool, keepalive_command
+
+    removed, started, running = [], [], set()
+
+    def start():
+        started.append("c{}".format(len(started)))
+        running.add(started[-1])
+        return started[-1]
+
+    pool = WarmContainerPool(removed.append, alive=running.__contains__)
+    first = pool.acquire("sig", [str(tmpdir)], start)
+    pool.release(first)
+    # the container exited on its own, a fresh one is started instead
+    running.remove("c0")
+    assert pool.acquire("sig", [str(tmpdir)], start).cid == "c1"
+    assert removed == ["c0"]
+
+    # sub-second timeouts do not turn into busy loops
+    assert "sleep 1;" in keepalive_command(0.2)[-1]
+
+
+def test_warm_container_keepalive(tmpdir):
+    from packtivity.warmcontainers import keepalive_command, leased_command
+
+    files = {"lease": str(tmpdir.join("lease")), "jobs": str(tmpdir.join("jobs"))}
+    keepalive = subprocess.Popen(keepalive_command(1, **files))
+    try:
+        # a running job keeps the container alive beyond the idle timeout
+        assert subprocess.call(leased_command(["sleep", "2.5"], **files)) == 0
+        assert keepalive.poll() is None
+        assert keepalive.wait(timeout=5) == 0
+    finally:
+        keepalive.kill()
+    assert subprocess.call(leased_command(["sh", "-c", "exit 3"], **files)) == 3
+
+
+def test_warm_container_pools(monkeypatch):
+    from packtivity.handlers import execution_handlers
+
+    monkeypatch.setattr(execution_handlers, "_warm_pools", {})
+    monkeypatch.setattr(execution_handlers, "sweep_warm_containers", lambda log: [])
+    config = ExecutionConfig()
+    pool = execution_handlers.warm_container_pool(config)
+    assert execution_handlers.warm_container_pool(config) is pool
+    monkeypatch.setenv("PACKTIVITY_DOCKER_WARM_MAX_REUSES", "1")
+    other = execution_handlers.warm_container_pool(config)
+    assert other is not pool
+    assert other.max_reuses == 1
+
+
+def test_sweep_warm_containers(monkeypatch):
+    import os
+    import socket
+    from packtivity.handlers import execution_handlers
+
+    dead = subprocess.Popen(["true"])
+    dead.wait()
+    listing = "\n".join(
+        [
+            "alive {}:{}".format(socket.gethostname(), os.getpid()),
+            "orphan {}:{}".format(socket.gethostname(), dead.pid),
+            "remote otherhost:{}".format(dead.pid),
+        ]
+    )
+    removed = []
+
+    def docker_ps(cmd, **kwargs):
+        # --quiet would ignore the format with the owner label
+        assert "-q" not in cmd
+        return listing.encode("utf-8")
+
+    monkeypatch.setattr(execution_handlers.subprocess, "check_output", docker_ps)
+    monkeypatch.setattr(
+        execution_handlers.subprocess,
+        "call",
+        lambda cmd, **kwargs: removed.append(cmd[-1]),
+    )
+    log = logging.getLogger("test")
+    assert execution_handlers.sweep_warm_containers(log) == ["orphan"]
+    assert removed == ["orphan"]
+
+
+def test_docker_exec_cmdline():
+    from packtivity.handlers.execution_handlers import (
+        docker_exec_cmdline,
+        warm_container_signature,
+    )
+    from packtivity.warmcontainers import leased_command
+
+    rspec = {
+        "workdir": "/work",
+        "stdin": "echo hi",
+        "tty": False,
+        "argv": ["sh", "-c", "cat"],
+        "image": "busybox:latest",
+        "mounts": [
+            {"type": "bind", "source": "/a", "destination": "/a", "readonly": False}
+        ],
+        "env": [{"name": "KEY", "value": "value"}],
+    }
+    cmdline = docker_exec_cmdline(ExecutionConfig(), "abc", rspec)
+    assert shlex.split(cmdline)[:8] == [
+        "docker",
+        "exec",
+        "-i",
+        "-w",
+        "/work",
+        "-e",
+        "KEY=value",
+        "abc",
+    ]
+    assert shlex.split(cmdline)[8:] == leased_command(["sh", "-c", "cat"])
+    config = ExecutionConfig()
+    signature = warm_container_signature(config, rspec)
+    rspec["workdir"] = "/other"
+    assert warm_container_signature(config, rspec) == signature
+    rspec["mounts"][0]["readonly"] = True
+    assert warm_container_signature(config, rspec) != signature
@@ -0,0 +1,299 @@
+import pytest
+
+kubernetes = pytest.importorskip("kubernetes")
+
+import urllib3
+from kubernetes import client
+from packtivity.kubernetes.jobinformer import JobStatusInformer, label_selector
+
+
+def make_job(name, succeeded=None, failed=None, resource_version="1"):
+    return client.V1Job(
+        metadata=client.V1ObjectMeta(name=name, resource_version=resource_version),
+        status=client.V1JobStatus(succeeded=succeeded, failed=failed),
+    )
+
+
+class FakeBatchApi(object):
+    def __init__(self, jobs):
+        self.jobs = jobs
+        self.list_calls = 0
+
+    def list_namespaced_job(self, namespace, **kwargs):
+        self.list_calls += 1
+        return client.V1JobList(
+            items=self.jobs, metadata=client.V1ListMeta(resource_version="1")
+        )
+
+
+class FakeWatch(object):
+    def __init__(self, events, error=None):
+        self.events = events
+        self.error = error
+        self.kwargs = None
+
+    def __call__(self):
+        return self
+
+    def stream(self, func, namespace, **kwargs):
+        self.kwargs = kwargs
+        for event in self.events:
+            yield event
+        if self.error:
+            raise self.error
+
+    def stop(self):
+        pass
+
+
+def test_label_selector():
+    assert label_selector({"b": "2", "a": "1"}) == "a=1,b=2"
+
+
+def test_informer_index():
+    api = FakeBatchApi([make_job("one"), make_job("two", succeeded=1)])
+    fakewatch = FakeWatch(
+        [
+            {
+                "type": "MODIFIED",
+                "object": make_job("one", failed=1, resource_version="2"),
+            },
+            {"type": "ADDED", "object": make_job("three", resource_version="3")},
+            {"type": "DELETED", "object": make_job("two", resource_version="4")},
+        ]
+    )
+    informer = JobStatusInformer(
+        api, "default", "component=yadage", watch_factory=fakewatch
+    )
+    informer.watch_once()
+
+    assert informer.synced.is_set()
+    assert fakewatch.kwargs["resource_version"] == "1"
+    assert informer.status("one").failed == 1
+    assert informer.status("three").succeeded is None
+    assert informer.status("two") is None
+
+
+def test_informer_expired_resource_version():
+    api = FakeBatchApi([make_job("one")])
+    expired = client.rest.ApiException(status=410, reason="Expired")
+    informer = JobStatusInformer(
+        api, "default", "component=yadage", watch_factory=FakeWatch([], expired)
+    )
+    informer.watch_once()
+    informer.watch_once()
+    assert api.list_calls == 2
+
+    failing = client.rest.ApiException(status=500, reason="Error")
+    informer.watch_factory = FakeWatch([], failing)
+    with pytest.raises(client.rest.ApiException):
+        informer.watch_once()
+
+
+class PagedBatchApi(object):
+    def __init__(self, pages):
+        self.pages = pages
+        self.calls = []
+
+    def list_namespaced_job(self, namespace, **kwargs):
+        self.calls.append(kwargs)
+        page = len(self.calls) - 1
+        return client.V1JobList(
+            items=self.pages[page],
+            metadata=client.V1ListMeta(
+                _continue=(
+                    "page{}".format(page + 1) if page + 1 < len(self.pages) else None
+                )
+            ),
+        )
+
+
+def make_submitter(batch_api):
+    from packtivity.kubernetes.kubesubmitmixin import SubmitToKubeMixin
+
+    submitter = SubmitToKubeMixin.__new__(SubmitToKubeMixin)
+    submitter.batch_api = batch_api
+    submitter.namespace = "default"
+    submitter.use_informer = False
+    submitter.resource_labels = {"component": "yadage"}
+    submitter.deleted = []
+    submitter.schedule_cleanup = submitter.deleted.append
+    return submitter
+
+
+def test_ready_many():
+    api = PagedBatchApi(
+        [[make_job("one", succeeded=1)], [make_job("two"), make_job("three", failed=1)]]
+    )
+    submitter = make_submitter(api)
+
+    proxies = [
+        {"job_id": name, "resources": [name]}
+        for name in ["one", "two", "three", "unknown"]
+    ]
+    # "unknown" was deleted out-of-band and counts as failed
+    assert submitter.ready_many(proxies) == [1, None, 1, 1]
+    assert not submitter.successful(proxies[3])
+    assert [c.get("_continue") for c in api.calls] == [None, "page1"]
+    assert all(c["label_selector"] == "component=yadage" for c in api.calls)
+    assert submitter.deleted == [["one"]]
+    assert submitter.successful(proxies[0])
+
+    api.calls = []
+    assert submitter.ready_many(proxies[:1]) == [True]
+    assert api.calls == []
+
+
+def test_api_configuration():
+    from packtivity.kubernetes.kubesubmitmixin import SubmitToKubeMixin
+
+    submitter = SubmitToKubeMixin.__new__(SubmitToKubeMixin)
+    configuration = submitter.api_configuration(connection_pool_size=7)
+    assert configuration.connection_pool_maxsize == 7
+    assert configuration.socket_options
+
+    configuration = submitter.api_configuration(keep_alive=False)
+    assert not configuration.socket_options
+
+
+class RecordingApi(object):
+    def __init__(self, failing=()):
+        self.calls = []
+        self.failing = failing
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            if name in self.failing:
+                raise client.rest.ApiException(status=500, reason="Error")
+            if name == "create_namespaced_job":
+                return client.V1Job(
+                    metadata=client.V1ObjectMeta(name=args[1].metadata.name, uid="u1")
+                )
+
+        return call
+
+
+def test_create_and_cleanup():
+    import concurrent.futures
+    from packtivity.kubernetes.kubesubmitmixin import SubmitToKubeMixin
+
+    submitter = SubmitToKubeMixin.__new__(SubmitToKubeMixin)
+    submitter.namespace = "default"
+    submitter.resource_labels = {"component": "yadage"}
+    submitter.batch_api, submitter.core_api = RecordingApi(), RecordingApi()
+    submitter.submit_executor = concurrent.futures.ThreadPoolExecutor(2)
+    submitter.cleanup_executor = concurrent.futures.ThreadPoolExecutor(2)
+
+    resources = [
+        {"kind": "ConfigMap", "metadata": {"name": "cm"}, "data": {}},
+        {
+            "kind": "Job",
+            "apiVersion": "batch/v1",
+            "metadata": {"name": "job"},
+            "spec": {"template": {"spec": {"containers": []}}},
+        },
+    ]
+    submitter.create_kube_resources(resources)
+    assert [c[0] for c in submitter.batch_api.calls] == ["create_namespaced_job"]
+    assert [c[0] for c in submitter.core_api.calls] == ["create_namespaced_config_map"]
+    configmap = submitter.core_api.calls[0][1][1]
+    owner = configmap.metadata.owner_references[0]
+    assert (owner.kind, owner.name, owner.uid) == ("Job", "job", "u1")
+
+    submitter.schedule_cleanup(resources)
+    submitter.cleanup_executor.shutdown()
+    name, args, kwargs = submitter.batch_api.calls[-1]
+    assert name == "delete_namespaced_job"
+    assert kwargs["propagation_policy"] == "Background"
+    assert submitter.core_api.calls[-1][0] == "delete_namespaced_config_map"
+
+
+class ReadBatchApi(object):
+    def __init__(self, jobs):
+        self.jobs = {j.metadata.name: j for j in jobs}
+        self.reads = []
+
+    def read_namespaced_job(self, name, namespace):
+        self.reads.append(name)
+        if name not in self.jobs:
+            raise client.rest.ApiException(status=404, reason="Not Found")
+        return self.jobs[name]
+
+    def list_namespaced_job(self, namespace, **kwargs):
+        return client.V1JobList(items=list(self.jobs.values()))
+
+
+def test_informer_job_status():
+    submitter = make_submitter(ReadBatchApi([make_job("late", succeeded=1)]))
+    submitter.use_informer = True
+    submitter.informer_sync_timeout = 0
+    submitter.informer = JobStatusInformer(
+        FakeBatchApi([make_job("known", succeeded=1)]), "default", ""
+    )
+
+    # not synced yet, the jobs are read directly
+    assert submitter.check_k8s_job_status("late").succeeded == 1
+    submitter.informer.relist()
+    assert submitter.check_k8s_job_status("known").succeeded == 1
+    assert submitter.batch_api.reads == ["late"]
+
+    # jobs missing from the index are read, deleted jobs count as failed
+    assert submitter.check_k8s_job_status("late").succeeded == 1
+    assert submitter.check_k8s_job_status("deleted").failed == 1
+    assert submitter.batch_api.reads == ["late", "late", "deleted"]
+
+
+def test_create_rollback_and_late_cleanup():
+    import concurrent.futures
+    from packtivity.kubernetes.kubesubmitmixin import SubmitToKubeMixin
+
+    submitter = SubmitToKubeMixin.__new__(SubmitToKubeMixin)
+    submitter.namespace = "default"
+    submitter.resource_labels = {"component": "yadage"}
+    submitter.batch_api = RecordingApi()
+    submitter.core_api = RecordingApi(failing=["create_namespaced_config_map"])
+    submitter.submit_executor = concurrent.futures.ThreadPoolExecutor(2)
+    submitter.cleanup_executor = concurrent.futures.ThreadPoolExecutor(2)
+
+    resources = [
+        {"kind": "ConfigMap", "metadata": {"name": "cm"}, "data": {}},
+        {
+            "kind": "Job",
+            "apiVersion": "batch/v1",
+            "metadata": {"name": "job"},
+            "spec": {"template": {"spec": {"containers": []}}},
+        },
+    ]
+    with pytest.raises(client.rest.ApiException):
+        submitter.create_kube_resources(resources)
+    # the job is deleted again, the configmap was never created
+    assert [c[0] for c in submitter.batch_api.calls] == [
+        "create_namespaced_job",
+        "delete_namespaced_job",
+    ]
+    assert [c[0] for c in submitter.core_api.calls] == ["create_namespaced_config_map"]
+
+    # cleanups scheduled after shutting down are done right away
+    submitter.cleanup_executor.shutdown()
+    submitter.schedule_cleanup(resources[1:])
+    assert submitter.batch_api.calls[-1][0] == "delete_namespaced_job"
+    assert len(submitter.batch_api.calls) == 3
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        client.rest.ApiException(status=410, reason="Expired"),
+        urllib3.exceptions.ProtocolError("Connection broken"),
+        urllib3.exceptions.ReadTimeoutError(None, None, "timed out"),
+    ],
+)
+def test_wait_failing_watch(monkeypatch, error):
+    from packtivity.kubernetes import kubesubmitmixin
+
+    monkeypatch.setattr(kubesubmitmixin.watch, "Watch", FakeWatch([], error))
+    submitter = make_submitter(ReadBatchApi([make_job("job", succeeded=1)]))
+    proxy = {"job_id": "job", "resources": []}
+    assert submitter.wait(proxy, timeout=5)
+    assert submitter.batch_api.reads == ["job"]
@@ -20,3 +20,55 @@ def test_cliload_accept_non_valid():
     load_packtivity(
         "tests/testspecs/noop-test-invalid.yml", os.getcwd(), schemadir, False
     )
+
+
+def test_cached_load(tmpdir, monkeypatch):
+    monkeypatch.setenv("PACKTIVITY_SPEC_CACHE_DIR", str(tmpdir.join("cache")))
+    specfile = tmpdir.join("spec.yml")
+    with open("tests/testspecs/noop-test.yml") as f:
+        specfile.write(f.read())
+
+    first = load_packtivity("spec.yml", str(tmpdir), schemadir, True)
+    second = load_packtivity("spec.yml", str(tmpdir), schemadir, True)
+    assert first == second
+    assert first is not second
+    assert len(tmpdir.join("cache").listdir()) == 1
+
+    specfile.write("process: {}\n")
+    with pytest.raises(ValidationError):
+        load_packtivity("spec.yml", str(tmpdir), schemadir, True)
+
+
+def test_cached_load_references(tmpdir, monkeypatch):
+    import packtivity.utils as utils
+
+    monkeypatch.setenv("PACKTIVITY_SPEC_CACHE_DIR", str(tmpdir.join("cache")))
+    monkeypatch.setattr(utils, "_spec_cache", utils.collections.OrderedDict())
+    tmpdir.join("spec.yml").write(
+        "process: {$ref: 'parts/process.yml'}\n"
+        "publisher: {publisher_type: 'frompar-pub', outputmap: {}}\n"
+        "environment: {environment_type: 'localproc-env'}\n"
+    )
+    tmpdir.mkdir("parts").join("process.yml").write(
+        "process_type: 'string-interpolated-cmd'\ncmd: 'echo first'\n"
+    )
+    assert utils.spec_files(str(tmpdir.join("spec.yml"))) == [
+        str(tmpdir.join("spec.yml")),
+        str(tmpdir.join("parts", "process.yml")),
+    ]
+
+    first = load_packtivity("spec.yml", str(tmpdir), schemadir, True)
+    assert first["process"]["cmd"] == "echo first"
+    assert load_packtivity("spec.yml", str(tmpdir), schemadir, True) == first
+
+    # changes of referenced files invalidate the cached spec
+    tmpdir.join("parts", "process.yml").write(
+        "process_type: 'string-interpolated-cmd'\ncmd: 'echo second'\n"
+    )
+    second = load_packtivity("spec.yml", str(tmpdir), schemadir, True)
+    assert second["process"]["cmd"] == "echo second"
+
+    monkeypatch.setattr(utils, "SPEC_CACHE_SIZE", 1)
+    load_packtivity("tests/testspecs/noop-test.yml", os.getcwd(), schemadir, True)
+    load_packtivity("spec.yml", str(tmpdir), schemadir, True)
+    assert len(utils._spec_cache) == 1
@@ -96,3 +96,74 @@ def test_pack_prepublish(tmpdir, basic_localfs_state, localproc_pack, default_sy
     assert default_sync.prepublish(
         localproc_pack.spec, pars, basic_localfs_state
     ).json() == {"output": str(tmpdir.join("helloworld.txt"))}
+
+
+def test_result_cache(tmpdir, localproc_packspec):
+    from packtivity.syncbackends import defaultsyncbackend
+    from packtivity.statecontexts.posixfs_context import LocalFSState
+
+    state = LocalFSState([str(tmpdir.join("work"))])
+    state.ensure()
+    backend = defaultsyncbackend({"exec": {"result_cache": str(tmpdir.join("cache"))}})
+    cache = backend.exec_config.result_cache()
+    pars = {"outputfile": "{workdir}/helloworld.txt"}
+
+    first = backend.run(localproc_packspec, pars, state)
+    assert cache.stats == {"hits": 0, "misses": 1, "stores": 1, "evictions": 0}
+    assert backend.run(localproc_packspec, pars, state).json() == first.json()
+    assert cache.stats["hits"] == 1
+
+    # missing outputs are not served from the cache
+    tmpdir.join("work", "helloworld.txt").remove()
+    backend.run(localproc_packspec, pars, state)
+    assert tmpdir.join("work", "helloworld.txt").check()
+    assert cache.stats["misses"] == 2
+
+    cache.max_entries = 1
+    backend.run(localproc_packspec, {"outputfile": "{workdir}/other.txt"}, state)
+    assert cache.stats["evictions"] == 1
+    assert len(list(cache.entries())) == 1
+
+    # file digests are kept in an index in the cache location
+    assert tmpdir.join("cache", "state_hash_index.json").check()
+
+    # failing to store a result does not fail the step
+    def failing_store(*args):
+        raise OSError("disk full")
+
+    cache.store = failing_store
+    backend.run(localproc_packspec, {"outputfile": "{workdir}/third.txt"}, state)
+    assert tmpdir.join("work", "third.txt").check()
+
+
+def test_result_cache_index(tmpdir, monkeypatch):
+    from packtivity import datamodel as pdm
+    from packtivity.resultcache import ResultCache
+    from packtivity.statecontexts import statehash
+    from packtivity.statecontexts.posixfs_context import LocalFSState
+
+    upstream = tmpdir.mkdir("upstream")
+    for i in range(5):
+        upstream.join("input{}.txt".format(i)).write(str(i))
+    state = LocalFSState([str(tmpdir.join("work"))], [str(upstream)])
+    state.ensure()
+    tmpdir.join("work", "output.txt").write("output")
+
+    digested = []
+    file_digest = statehash.file_digest
+    monkeypatch.setattr(
+        statehash,
+        "file_digest",
+        lambda path: digested.append(path) or file_digest(path),
+    )
+    parameters = pdm.create({})
+    cache = ResultCache(str(tmpdir.join("cache")))
+    key = cache.key({}, parameters, state)
+    cache.outputs_hash(state)
+    assert len(digested) == 6
+
+    # neither hashing the outputs nor other processes drop the input digests
+    del digested[:]
+    assert cache.key({}, parameters, state) == key
+    assert ResultCache(str(tmpdir.join("cache"))).key({}, parameters, state) == key
+    assert digested == []
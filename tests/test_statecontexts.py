@@ -12,3 +12,67 @@ def test_pack_call_local(tmpdir, basic_localfs_state):
 
     assert newpars["banner_file"] == os.path.join(str(tmpdir), "banner.txt")
     assert newpars["parcard"][0] == os.path.join(str(tmpdir), "parcard.dat")
+
+
+def test_model_purejson(tmpdir, basic_localfs_state, monkeypatch):
+    monkeypatch.setenv("PACKTIVITY_DATAMODEL_IMPL", "purejson")
+    pars = pdm.create({"outputs": ["{workdir}/a.txt", 3], "single": "{workdir}"})
+
+    newpars = basic_localfs_state.model(pars)
+
+    assert newpars.json() == {
+        "outputs": [os.path.join(str(tmpdir), "a.txt"), 3],
+        "single": str(tmpdir),
+    }
+    assert pars["single"] == "{workdir}"
+
+
+def test_incremental_state_hash(tmpdir):
+    from packtivity.statecontexts.posixfs_context import LocalFSState
+
+    readonly = tmpdir.mkdir("upstream")
+    readonly.join("input.txt").write("input")
+    workdir = tmpdir.mkdir("work")
+    workdir.join("a.txt").write("a")
+    workdir.mkdir("sub").join("b.txt").write("b")
+
+    state = LocalFSState(readwrite=[str(workdir)], readonly=[str(readonly)])
+    state.ensure()
+
+    plain = state.state_hash()
+    assert state.state_hash(incremental=True, jobs=2) == plain
+    assert os.path.exists(os.path.join(state.metadir, "state_hash_index.json"))
+    # the index itself does not change the hash
+    assert state.state_hash() == plain
+    assert state.state_hash(incremental=True) == plain
+
+    workdir.join("sub", "b.txt").write("changed")
+    assert state.state_hash(incremental=True) == state.state_hash()
+    assert state.state_hash(incremental=True) != plain
+
+
+def test_incremental_state_hash_rehashes_changed_files(tmpdir, monkeypatch):
+    from packtivity.statecontexts import statehash
+    from packtivity.statecontexts.posixfs_context import LocalFSState
+
+    workdir = tmpdir.mkdir("work")
+    for name in ["a.txt", "b.txt", "c.txt"]:
+        workdir.join(name).write(name)
+    state = LocalFSState(readwrite=[str(workdir)])
+    state.ensure()
+
+    digested = []
+    file_digest = statehash.file_digest
+    monkeypatch.setattr(
+        statehash,
+        "file_digest",
+        lambda path: digested.append(os.path.basename(path)) or file_digest(path),
+    )
+
+    first = state.state_hash(incremental=True)
+    assert sorted(digested) == ["a.txt", "b.txt", "c.txt"]
+
+    del digested[:]
+    workdir.join("b.txt").write("changed")
+    assert state.state_hash(incremental=True) != first
+    assert digested == ["b.txt"]
@@ -1,3 +1,8 @@
+import json
+import sys
+
+import pytest
+
 from packtivity.typedleafs import TypedLeafs
 
 
@@ -20,6 +25,30 @@ simple_data = {
     "hello": {"$type": "MyClass", "first_attr": "hello", "second_attr": "world"}
 }
 
+# tests of one specific implementation, not to be repeated for the other
+typedleafs_only = [
+    "test_copy_on_write",
+    "test_purejson_copy_on_write",
+    "test_purejson_shared_reads",
+    "test_persistent_versions",
+]
+
+
+@pytest.fixture(autouse=True, params=["typedleafs", "persistent"])
+def leafs_impl(request, monkeypatch):
+    """
+    runs every test against both TypedLeafs and PersistentLeafs
+    """
+    if request.param == "persistent":
+        if request.function.__name__ in typedleafs_only:
+            pytest.skip("implementation specific test")
+        persistent = pytest.importorskip("packtivity.datamodels.persistent")
+        monkeypatch.setattr(
+            sys.modules[__name__], "TypedLeafs", persistent.PersistentLeafs
+        )
+    return request.param
+
+
 nested_data = {
     "list_of_things": [
         {"$type": "MyClass", "first_attr": "hello", "second_attr": "world"},
@@ -107,3 +136,232 @@ def test_modify():
     tl["single_thing"] = tlnew.typed()
     assert type(tlnew.typed()) == MyClass
     assert tl["single_thing"].json() == tlnew.typed().json()
+
+
+def test_typed_cache():
+    tl = TypedLeafs(nested_data, datamodel)
+    assert tl.typed() is tl.typed()
+
+    before = tl.typed()
+    tl["single_thing"] = {"$type": "MyClass", "first_attr": "a", "second_attr": "b"}
+    assert tl.typed() is not before
+    assert tl["single_thing"].first_attr == "a"
+
+    del tl["single_thing"]
+    assert "single_thing" not in tl.typed()
+
+
+def test_replace_many():
+    import jsonpointer
+
+    tl = TypedLeafs(nested_data, datamodel)
+    tl.replace_many(
+        [
+            (jsonpointer.JsonPointer("/list_of_things/0"), "first"),
+            (jsonpointer.JsonPointer("/single_thing"), "single"),
+        ]
+    )
+    assert tl["list_of_things"][0] == "first"
+    assert type(tl["list_of_things"][1]) == MyClass
+    assert tl["single_thing"] == "single"
+    assert type(nested_data["single_thing"]) == dict
+
+    tl.replace_many([(jsonpointer.JsonPointer(""), "root")])
+    assert tl.typed() == "root"
+
+
+def test_normalized():
+    tl = TypedLeafs(nested_data, datamodel)
+    trusted = TypedLeafs(tl.json(), datamodel, normalized=True)
+    assert trusted.json() is tl.json()
+    assert type(trusted["single_thing"]) == MyClass
+
+    trusted["single_thing"] = "changed"
+    assert type(tl["single_thing"]) == MyClass
+
+
+def test_encoded_leafs():
+    tl = TypedLeafs(nested_data, datamodel)
+    encoded = TypedLeafs(tl.typed(idleafs=True), datamodel)
+    assert encoded.json() == nested_data
+
+
+def test_json_codecs():
+    import pytest
+    from packtivity import jsoncodec
+
+    leafmodel = TypedLeafs({}, datamodel)._leafmodel
+    for name in ["json", "orjson"]:
+        codec = jsoncodec.make_codec(name)
+        thing = MyClass("hello", "world")
+        dumped = codec.dumps({"b": thing, "a": 2**70}, default=leafmodel.dumper)
+        assert codec.loads(dumped) == {"b": simple_data["hello"], "a": 2**70}
+        assert list(codec.loads(codec.dumps({"b": 1, "a": 2}, sort_keys=True))) == [
+            "a",
+            "b",
+        ]
+        assert codec.loads(codec.dumps({1: "one"})) == {"1": "one"}
+        with pytest.raises(TypeError):
+            codec.dumps({"thing": thing})
+        special = {"nan": float("nan"), "inf": [float("inf"), -float("inf")]}
+        assert codec.dumps(special) == json.dumps(special)
+        dumped = codec.dumps([MyClass(float("nan"), 1)], default=leafmodel.dumper)
+        assert '"first_attr": NaN' in dumped
+
+        try:
+            jsoncodec.use(name)
+            tl = TypedLeafs(nested_data, datamodel)
+            assert type(tl["single_thing"]) == MyClass
+            assert TypedLeafs(tl.typed(idleafs=True), datamodel).json() == nested_data
+        finally:
+            jsoncodec.use()
+
+
+def test_leafmodel_cache():
+    from packtivity.typedleafs import decode_b64json, get_leafmodel
+
+    first = TypedLeafs(simple_data, datamodel)
+    second = TypedLeafs(
+        nested_data, {"types": {"MyClass": MyClass}, "keyword": "$type"}
+    )
+    assert first._leafmodel is second._leafmodel
+    assert TypedLeafs(simple_data)._leafmodel is get_leafmodel(None)
+
+    class MyClass2(MyClass):
+        pass
+
+    other = get_leafmodel({"keyword": "$type", "types": {"MyClass": MyClass2}})
+    assert other is not first._leafmodel
+
+    encoded = first.typed(idleafs=True)["hello"]
+    decode_b64json.cache_clear()
+    for _ in range(3):
+        assert first._leafmodel.leaf_decode(encoded) == simple_data["hello"]
+    assert decode_b64json.cache_info().hits == 2
+
+    # decoded leafs are not shared between instances
+    encoded = first.typed(idleafs=True)
+    TypedLeafs(encoded, datamodel).json()["hello"]["first_attr"] = "mutated"
+    assert TypedLeafs(encoded, datamodel).json() == simple_data
+
+
+def test_copy_on_write():
+    import jsonpointer
+
+    tl = TypedLeafs(nested_data, datamodel)
+    copied = tl.copy()
+    assert copied.json() is tl.json()
+
+    copied.replace(jsonpointer.JsonPointer("/list_of_things/0/first_attr"), "changed")
+    assert tl["list_of_things"][0].first_attr == "hello"
+    assert copied["list_of_things"][0].first_attr == "changed"
+    # only the path to the replaced value is copied
+    assert copied.json()["single_thing"] is tl.json()["single_thing"]
+    assert copied.json()["list_of_things"][1] is tl.json()["list_of_things"][1]
+
+    refs = tl.asrefs()
+    assert refs["single_thing"].path == "/single_thing"
+    assert tl.json() == nested_data
+
+
+def test_purejson_copy_on_write():
+    import jsonpointer
+    from packtivity.datamodels.purejson import PureJsonModel
+
+    data = {"a": {"b": [1, 2]}, "c": {"d": 3}}
+    model = PureJsonModel(data)
+    copied = model.copy()
+    copied.replace(jsonpointer.JsonPointer("/a/b/0"), "x")
+    copied["e"] = 4
+    del model["c"]
+
+    assert data == {"a": {"b": [1, 2]}, "c": {"d": 3}}
+    assert model.json() == {"a": {"b": [1, 2]}}
+    assert copied.json() == {"a": {"b": ["x", 2]}, "c": {"d": 3}, "e": 4}
+    assert copied.json()["c"] is data["c"]
+
+
+def test_persistent_versions(monkeypatch):
+    import jsonpointer
+    from packtivity import datamodel as pdm
+    from packtivity.datamodels.persistent import PersistentLeafs
+
+    monkeypatch.setenv("PACKTIVITY_DATAMODEL_IMPL", "persistent")
+    first = pdm.create(nested_data, datamodel)
+    assert isinstance(first, PersistentLeafs)
+
+    versions = [first]
+    for i in range(3):
+        version = versions[-1].copy()
+        version.replace(jsonpointer.JsonPointer("/list_of_things/0/first_attr"), i)
+        versions.append(version)
+
+    assert first["list_of_things"][0].first_attr == "hello"
+    assert [v["list_of_things"][0].first_attr for v in versions[1:]] == [0, 1, 2]
+    # unchanged parts are shared between all versions
+    assert versions[3].frozen()["single_thing"] is first.frozen()["single_thing"]
+    assert (
+        versions[3].frozen()["list_of_things"][1] is first.frozen()["list_of_things"][1]
+    )
+
+    nested = TypedLeafs({"inner": versions[1]}, datamodel)
+    assert nested.json()["inner"] == versions[1].json()
+
+
+def test_query_many():
+    from packtivity.utils import json_pointer, jsonpath_expression
+
+    tl = TypedLeafs(nested_data, datamodel)
+    jsonpath_expression.cache_clear()
+    first, pointed, things = tl.query_many(
+        [
+            ("jsonpath", "list_of_things[0]"),
+            ("jsonpointer", "/list_of_things/1"),
+            ("jsonpath", "list_of_things[*]"),
+        ]
+    )
+    assert type(first) == MyClass
+    assert pointed.first_attr == "hello"
+    assert type(things) == MyClass
+
+    assert len(tl.query_many([("jsonpath", "list_of_things[*]")], True)[0]) == 2
+    assert tl.jsonpath("list_of_things[0]").json() == first.json()
+    assert jsonpath_expression.cache_info().hits == 2
+    assert json_pointer("/single_thing") is json_pointer("/single_thing")
+
+    with pytest.raises(ValueError):
+        tl.query_many([("xpath", "/")])
+
+
+def test_add_keys():
+    import jsonpointer
+
+    tl = TypedLeafs({"a": 1, "nested": {"x": 1}}, datamodel)
+    copied = tl.copy()
+    copied["b"] = 2
+    copied.replace(jsonpointer.JsonPointer("/nested/y"), 5)
+    copied.replace(jsonpointer.JsonPointer("/single_thing"), simple_data["hello"])
+    assert copied.json() == {
+        "a": 1,
+        "b": 2,
+        "nested": {"x": 1, "y": 5},
+        "single_thing": simple_data["hello"],
+    }
+    assert type(copied["single_thing"]) == MyClass
+    assert tl.json() == {"a": 1, "nested": {"x": 1}}
+
+
+def test_purejson_shared_reads():
+    from packtivity.datamodels.purejson import PureJsonModel
+
+    data = {"a": [1, 2], "b": {"c": [3]}}
+    model = PureJsonModel(data)
+    copied = model.copy()
+    # reading does not copy anything
+    assert copied["a"] is model["a"] is data["a"]
+    assert copied.json() is model.json()
+
+    copied["a"] = copied["a"] + [3]
+    assert copied.json() == {"a": [1, 2, 3], "b": {"c": [3]}}
+    assert copied.json()["b"] is data["b"]
+    assert model.json() == data == {"a": [1, 2], "b": {"c": [3]}}
@@ -1,6 +1,12 @@
 import os
 import pytest
-from packtivity.utils import mkdir_p, leaf_iterator
+from packtivity.utils import (
+    mkdir_p,
+    leaf_iterator,
+    jq_program,
+    backoff_periods,
+    wait_until_ready,
+)
 
 
 def test_mkdir_notexist(tmpdir):
@@ -37,3 +43,80 @@ def test_leafit():
         ("/hello", "world"),
         ("/bool", True),
     }
+
+
+def test_leafit_skips_null_and_false():
+    testdata = {"none": None, "false": False, "zero": 0, "list": [None, "a"]}
+    leafs = set([(x.path, y) for x, y in leaf_iterator(testdata)])
+    assert leafs == {("/zero", 0), ("/list/1", "a")}
+
+
+def test_leafit_scalar():
+    assert [(x.path, y) for x, y in leaf_iterator("hello")] == [("", "hello")]
+
+
+def test_jq_program_cache():
+    before = jq_program.cache_info()
+    program = jq_program(".hello")
+    assert jq_program(".hello") is program
+    assert program.transform({"hello": "world"}) == "world"
+    after = jq_program.cache_info()
+    assert after.hits >= before.hits + 1
+
+
+def test_backoff_periods():
+    periods = backoff_periods(initial=1, maximum=10, factor=2, jitter=0.1)
+    values = [next(periods) for _ in range(6)]
+    for value, expected in zip(values, [1, 2, 4, 8, 10, 10]):
+        assert expected * 0.9 <= value <= expected * 1.1
+
+
+class PollingBackend(object):
+    def __init__(self, ready_after):
+        self.polls = 0
+        self.ready_after = ready_after
+
+    def ready(self, proxy):
+        self.polls += 1
+        return self.polls >= self.ready_after
+
+
+class WaitingBackend(PollingBackend):
+    def wait(self, proxy, timeout):
+        self.timeout = timeout
+        return self.ready(proxy)
+
+
+def test_wait_until_ready():
+    backend = PollingBackend(ready_after=3)
+    assert wait_until_ready(backend, None, 10, backoff_periods(0.001))
+    assert backend.polls == 3
+
+    backend = PollingBackend(ready_after=1000)
+    assert not wait_until_ready(backend, None, 0.05, backoff_periods(0.001))
+
+    backend = WaitingBackend(ready_after=1)
+    assert wait_until_ready(backend, None, 10)
+    assert 9 < backend.timeout <= 10
+
+    # finite periods, the last one is repeated
+    backend = PollingBackend(ready_after=5)
+    assert wait_until_ready(backend, None, 10, [0.001, 0.002])
+    assert backend.polls == 5
+    backend = PollingBackend(ready_after=2)
+    assert wait_until_ready(backend, None, 10, [])
+
+
+def test_cow_set():
+    import jsonpointer
+    from packtivity.utils import cow_set
+
+    data = {"a": [{"b": 1}, {"c": 2}], "d": {"e": 3}}
+    owned = {}
+    new = cow_set(data, jsonpointer.JsonPointer("/a/0/b"), 5, owned)
+    new = cow_set(new, jsonpointer.JsonPointer("/a/-"), 6, owned)
+    assert data == {"a": [{"b": 1}, {"c": 2}], "d": {"e": 3}}
+    assert new == {"a": [{"b": 5}, {"c": 2}, 6], "d": {"e": 3}}
+    assert new["d"] is data["d"] and new["a"][1] is data["a"][1]
+    assert len(owned) == 3
+    assert cow_set(data, jsonpointer.JsonPointer(""), 1, owned) == 1